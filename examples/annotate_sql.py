@@ -19,12 +19,16 @@ Date: January 25, 2023
 from __future__ import annotations
 
 import logging
+import os
 import pathlib
+import re
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
 from logging.config import dictConfig
 from string import Template
 
 import click
-from datahub_tools.utils import extract_dbt_resources
+from datahub_tools.dbt import RESOURCE_NAME_KEY, iter_dbt_resources
 
 # Every link shares this same prefix. We specify it separately so that we can remove
 # links before writing them again (avoiding more than one link showing).
@@ -34,6 +38,31 @@ DH_LINK_PREFIX = "-- https://notion.acryl.io/dataset/urn:li:dataset:"
 DH_LINK = Template(
     f"{DH_LINK_PREFIX}(urn:li:dataPlatform:dbt,$table_name,PROD)  --noqa\n"
 )
+# the snapshot header and footer are not part of a snapshot's raw sql
+SNAPSHOT_TMPL = "{{% snapshot {name} %}}\n\n{code}\n\n{{% endsnapshot %}}\n"
+
+# replacements applied to the output of config_to_str, in a single pass
+_CONFIG_SUBS = {
+    # HACK: see `get_cleaned_config` for why this bit is needed
+    "anomalo_check_offset = \"-var('mrr_look_back_days')\"": (
+        "anomalo_check_offset = -var('mrr_look_back_days')"
+    ),
+    # True/False works just fine, but we should be consistent across all files and
+    # lowercase is used much more often than the upper case flavors.
+    ": False": ": false",
+    ": True": ": true",
+}
+_CONFIG_SUBS_RE = re.compile("|".join(map(re.escape, _CONFIG_SUBS)))
+# the keys of each dbt resource read by _write_one
+_RESOURCE_FIELDS = (
+    "original_file_path",
+    "raw_code",
+    "raw_sql",
+    "resource_type",
+    "alias",
+    "name",
+    "root_path",
+)
 
 
 def setup_logging(level: int = logging.INFO):
@@ -77,16 +106,49 @@ def config_to_str(config: dict):
         all_str.append(to_append)
     joined_str = ",\n        ".join(all_str)
     out = f"{{{{\n    config(\n        {joined_str}\n    )\n}}}}\n" if config else ""
-    return (
-        # HACK: see `get_cleaned_config` for why this bit is needed
-        out.replace(
-            "anomalo_check_offset = \"-var('mrr_look_back_days')\"",
-            "anomalo_check_offset = -var('mrr_look_back_days')",
+    return _CONFIG_SUBS_RE.sub(lambda m: _CONFIG_SUBS[m.group(0)], out)
+
+
+def _write_one(resource: tuple[str, dict]) -> None:
+    """
+    Write the SQL file of the given dbt resource with a link to its DataHub page
+    at the top.
+    :param resource: (unique_id, node) as yielded by iter_dbt_resources
+    """
+    logger = logging.getLogger(__name__)
+    unique_id, node = resource
+    logger.info(unique_id)
+    original_file_path = node.get("original_file_path")
+    if not (original_file_path and original_file_path.endswith(".sql")):
+        return
+
+    # assemble the DataHub link
+    datahub_link = DH_LINK.substitute(table_name=node[RESOURCE_NAME_KEY])
+    logger.info(datahub_link)
+    code: str = node.get("raw_code") or node.get("raw_sql")
+
+    if not code:
+        logger.error("DBT did not produce code for: %s", original_file_path)
+        return
+
+    # remove any existing links
+    if code.startswith(DH_LINK_PREFIX):
+        code = "\n".join(code.split("\n")[1:])
+
+    # the snapshot header and footer will not be present in the raw sql, and so we have to add them
+    # back in before writing
+    if node["resource_type"] == "snapshot":
+        wrapped_out_code = SNAPSHOT_TMPL.format(
+            name=node["alias"] or node["name"], code=code.strip()
         )
-        # True/False works just fine, but we should be consistent across all files and
-        # lowercase is used much more often than the upper case flavors.
-        .replace(": False", ": false").replace(": True", ": true")
-    )
+    else:
+        wrapped_out_code = code
+
+    suffix = "" if wrapped_out_code.endswith("\n") else "\n"
+
+    file_path = pathlib.Path(node["root_path"], original_file_path)
+    logger.info(file_path)
+    file_path.write_text(f"{datahub_link}{wrapped_out_code}{suffix}")
 
 
 @click.command()
@@ -111,44 +173,20 @@ def main(manifest_file: pathlib.Path, resource_type_filter: list[str] | None):
     """
     Insert a link to each model's DataHub page at the top of each SQL file
     """
-    logger = logging.getLogger(__name__)
-    dbt_resources = extract_dbt_resources(
-        manifest_file=manifest_file, resource_type_filter=resource_type_filter
+    # each node is only needed once, so the manifest is streamed
+    dbt_resources = iter_dbt_resources(
+        manifest_file=manifest_file,
+        resource_type_filter=resource_type_filter,
+        fields=_RESOURCE_FIELDS,
     )
-    for unique_id, node in dbt_resources:
-        logger.info(unique_id)
-        original_file_path = node.get("original_file_path")
-        if original_file_path and original_file_path.endswith(".sql"):
-            # assemble the DataHub link
-            name = f"{node['alias'] or node['name']}"
-            table_name = f"{node['database']}.{node['schema']}.{name}"
-            datahub_link = DH_LINK.substitute(table_name=table_name)
-            logger.info(datahub_link)
-            code: str = node.get("raw_code") or node.get("raw_sql")
-
-            if not code:
-                logger.error("DBT did not produce code for: %s", original_file_path)
-                continue
-
-            # remove any existing links
-            if code.startswith(DH_LINK_PREFIX):
-                code = "\n".join(code.split("\n")[1:])
-
-            # the snapshot header and footer will not be present in the raw sql, and so we have to add them
-            # back in before writing
-            if node["resource_type"] == "snapshot":
-                wrapped_out_code = f"{{% snapshot {name} %}}\n\n{code.strip()}\n\n{{% endsnapshot %}}\n"
-            else:
-                wrapped_out_code = code
-
-            suffix = "" if wrapped_out_code.endswith("\n") else "\n"
-
-            file_path = pathlib.Path(node["root_path"]) / pathlib.Path(
-                original_file_path
-            )
-            logger.info(file_path)
-            with file_path.open(mode="w") as f:
-                f.writelines(f"{datahub_link}{wrapped_out_code}{suffix}")
+    # writing the files is I/O bound, so threads let the writes overlap
+    max_workers = (os.cpu_count() or 1) * 4
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        # executor.map submits everything up front, so the resources are handed over a
+        # few at a time to keep the manifest streamed
+        while batch := list(islice(dbt_resources, max_workers * 2)):
+            # list() to consume the results, which re-raises any exception
+            list(executor.map(_write_one, batch))
 
 
 if __name__ == "__main__":
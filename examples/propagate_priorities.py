@@ -18,7 +18,9 @@ Date: January 25, 2023
 
 from __future__ import annotations
 
+import functools
 import logging
+from collections import defaultdict
 from pathlib import Path
 from typing import Any
 
@@ -26,15 +28,23 @@ import click
 import datahub.emitter.mce_builder as builder
 from datahub_tools.classes import DHEntity
 from datahub_tools.client import (
-    emit_metadata,
+    emit_metadata_patches,
     get_datahub_entities,
-    remove_tags,
-    set_tags,
+    update_tags,
+)
+from datahub_tools.dbt import (
+    DEFAULT_CACHE_DIR,
+    RESOURCE_NAME_KEY,
+    extract_dbt_resources,
 )
-from datahub_tools.utils import extract_dbt_resources
 
 
-def _to_priority_urn(priority: str) -> str:
+# only a handful of distinct priorities exist, so the URNs are cached
+@functools.lru_cache(maxsize=32)
+def _to_priority_urn(priority: str | None) -> str | None:
+    if priority is None:
+        # the entity does not have a priority tag
+        return None
     assert len(priority) == 2
     return builder.make_tag_urn(f"Priority: {priority}")
 
@@ -59,8 +69,14 @@ def assemble_priority_metadata(dbt_resource: dict[str, Any]) -> dict[str, str]:
 def _set_priority_tags(
     add_tags: dict[str, list[DHEntity]],
     rem_tags: dict[str, list[DHEntity]],
+    metadata_by_urn: dict[str, dict[str, str]],
     dry_run: bool,
-):
+) -> set[str]:
+    """
+    Adds/removes the priority tags and folds the matching "priority" entry into the
+    metadata changes of each affected entity (metadata_by_urn is updated in place).
+    :return: the urns of the entities whose "priority" metadata must be removed
+    """
     logger = logging.getLogger(__name__)
     logger.info("--- Tags to add:")
     for tag, resources in add_tags.items():
@@ -71,25 +87,29 @@ def _set_priority_tags(
         for res in resources:
             logger.info("%s : %s", tag, res.name)
 
+    # -- removals
+    remove_priority_urns = {
+        entity.urn for entities in rem_tags.values() for entity in entities
+    }
+
+    # -- adds
+    for tag_urn, entities in add_tags.items():
+        for entity in entities:
+            # the priority is replaced, not removed
+            remove_priority_urns.discard(entity.urn)
+            metadata = metadata_by_urn.setdefault(entity.urn, {})
+            # tag_urn example: urn:li:tag:Priority: P0
+            # tag_urn.rsplit(" ")[1] ==> 'P0'
+            metadata["priority"] = tag_urn.rsplit(" ")[1]
+
     if not dry_run:
-        # -- removals
-        for tag_urn, entities in rem_tags.items():
-            remove_tags(tag_urns=tag_urn, resource_urns=[x.urn for x in entities])
-            for entity in entities:
-                metadata = entity.metadata.copy()
-                if "priority" in metadata:
-                    metadata.pop("priority")
-                emit_metadata(metadata=metadata, resource_urn=entity.urn)
-
-        # -- adds
-        for tag_urn, entities in add_tags.items():
-            set_tags(tag_urns=tag_urn, resource_urns=[x.urn for x in entities])
-            for entity in entities:
-                metadata = entity.metadata.copy()
-                # tag_urn example: urn:li:tag:Priority: P0
-                # tag_urn.rsplit(" ")[1] ==> 'P0'
-                metadata["priority"] = tag_urn.rsplit(" ")[1]
-                emit_metadata(metadata=metadata, resource_urn=entity.urn)
+        # the removals and adds are batched into a few requests, removals first
+        update_tags(
+            tags_to_add={k: [x.urn for x in v] for k, v in add_tags.items()},
+            tags_to_remove={k: [x.urn for x in v] for k, v in rem_tags.items()},
+        )
+
+    return remove_priority_urns
 
 
 @click.command()
@@ -106,7 +126,7 @@ def _set_priority_tags(
 )
 @click.option("--dry_run", is_flag=True, default=False)
 @click.pass_context
-def propagate_dbt_priority_metadata(manifest_file: Path, dry_run: bool):  # noqa
+def propagate_dbt_priority_metadata(manifest_file: Path, dry_run: bool):
     """
     Propagates dbt priority metadata flags to upstreams dbt resources
 
@@ -119,17 +139,23 @@ def propagate_dbt_priority_metadata(manifest_file: Path, dry_run: bool):  # noqa
     """
     logger = logging.getLogger(__name__)
 
-    dbt_resources_by_unique_id = extract_dbt_resources(manifest_file=manifest_file)
+    dbt_resources_by_unique_id = extract_dbt_resources(
+        manifest_file=manifest_file, cache_dir=DEFAULT_CACHE_DIR
+    )
     # we need the resources by its storage name instead of its unique_id as that is how
     # DataHub names resources
     dbt_resources_by_name = {
-        f"{v['database']}.{v['schema']}.{v['alias'] or v['name']}": v
-        for v in dbt_resources_by_unique_id.values()
+        v[RESOURCE_NAME_KEY]: v for v in dbt_resources_by_unique_id.values()
     }
-    entities: list[DHEntity] = get_datahub_entities()
-
-    add_tags = {}
-    rem_tags = {}
+    # only fetch the dbt entities from DataHub, and only keep those that can be matched
+    # to a dbt resource
+    entities: list[DHEntity] = get_datahub_entities(
+        name_filter=dbt_resources_by_name, platform="dbt"
+    )
+
+    add_tags: dict[str, list[DHEntity]] = defaultdict(list)
+    rem_tags: dict[str, list[DHEntity]] = defaultdict(list)
+    metadata_by_urn: dict[str, dict[str, str]] = {}
     for dh_entity in entities:
         dbt_resource = dbt_resources_by_name.get(dh_entity.name)
         if not dbt_resource:
@@ -144,40 +170,34 @@ def propagate_dbt_priority_metadata(manifest_file: Path, dry_run: bool):  # noqa
         if new_priority_tag_urn:
             if existing_priority_tag_urn:
                 if new_priority_tag_urn != existing_priority_tag_urn:
-                    entities = rem_tags.get(existing_priority_tag_urn, [])
-                    entities.append(dh_entity)
-                    if existing_priority_tag_urn not in rem_tags:
-                        rem_tags[existing_priority_tag_urn] = entities
-
-                    entities = add_tags.get(new_priority_tag_urn, [])
-                    entities.append(dh_entity)
-                    if new_priority_tag_urn not in add_tags:
-                        add_tags[new_priority_tag_urn] = entities
+                    rem_tags[existing_priority_tag_urn].append(dh_entity)
+                    add_tags[new_priority_tag_urn].append(dh_entity)
             else:
-                entities = add_tags.get(new_priority_tag_urn, [])
-                entities.append(dh_entity)
-                if new_priority_tag_urn not in add_tags:
-                    add_tags[new_priority_tag_urn] = entities
+                add_tags[new_priority_tag_urn].append(dh_entity)
         elif existing_priority_tag_urn:
-            entities = rem_tags.get(existing_priority_tag_urn, [])
-            entities.append(dh_entity)
-            if existing_priority_tag_urn not in rem_tags:
-                rem_tags[existing_priority_tag_urn] = entities
+            rem_tags[existing_priority_tag_urn].append(dh_entity)
         # ------
 
-        new_priority_metadata = assemble_priority_metadata(dbt_resource)
-        metadata = dh_entity.metadata.copy()
-        metadata.update(new_priority_metadata)
-        if dry_run:
-            logger.info(
-                "dry run: emit to %s:\n%s\nFull metadata: %s",
-                dh_entity.urn,
-                new_priority_metadata,
-                metadata,
-            )
-        else:
-            emit_metadata(metadata=metadata, resource_urn=dh_entity.urn)
+        # only the changes are sent to DataHub (as a patch), so the entity's existing
+        # metadata does not need to be copied
+        metadata_by_urn[dh_entity.urn] = dict(assemble_priority_metadata(dbt_resource))
 
     logger.info("[%d] Tags to add, [%d] tags to remove", len(add_tags), len(rem_tags))
 
-    _set_priority_tags(add_tags=add_tags, rem_tags=rem_tags, dry_run=dry_run)
+    remove_priority_urns = _set_priority_tags(
+        add_tags=add_tags,
+        rem_tags=rem_tags,
+        metadata_by_urn=metadata_by_urn,
+        dry_run=dry_run,
+    )
+
+    patches = [
+        (urn, metadata, ["priority"] if urn in remove_priority_urns else None)
+        for urn, metadata in metadata_by_urn.items()
+    ]
+    if dry_run:
+        for urn, metadata, remove in patches:
+            logger.info("dry run: patch %s:\nadd %s\nremove %s", urn, metadata, remove)
+    else:
+        # all the patches are sent together
+        emit_metadata_patches(items=patches)
@@ -5,13 +5,26 @@ from pathlib import Path
 from typing import Any
 
 import datahub.emitter.mce_builder as builder
-import jmespath
 from datahub_tools.dbt import (
-    ModelDependencies,
+    DEFAULT_CACHE_DIR,
     extract_dbt_resources,
-    get_dbt_dependencies,
+    get_dbt_direct_dependencies,
+    get_resource_name,
 )
 
+# bit flags used when propagating the priority metadata
+_REPORTED_EXTERNALLY = 1
+_DRIVES_COMPANY_METRICS = 2
+
+# priority (see PriorityMetadata.get_priority) : tag URN
+_PRIORITY_URNS = {p: builder.make_tag_urn(f"Priority: {p}") for p in ("P0", "P1", "P2")}
+
+
+def _get_notion_metadata(resource: dict) -> dict[str, Any]:
+    # note that our metadata is at this path, ['config']['notion_metadata'] but
+    # this path is not a standard entry found in dbt resources.
+    return (resource.get("config") or {}).get("notion_metadata") or {}
+
 
 @dataclass
 class PriorityMetadata:
@@ -31,11 +44,8 @@ class PriorityMetadata:
 
     @classmethod
     def from_resource(cls, resource: dict) -> PriorityMetadata:
-        # note that our metadata is at this path, ['config']['notion_metadata'] but
-        # this path is not a standard entry found in dbt resources.
-        metadata = jmespath.search("config.notion_metadata", resource) or {}
-        table_name = f"{resource['alias'] or resource['name']}"
-        resource_name = f"{resource['database']}.{resource['schema']}.{table_name}"
+        metadata = _get_notion_metadata(resource)
+        resource_name = get_resource_name(resource)
         is_reported_externally = metadata.get("is_reported_externally")
         is_used_to_drive_company_metrics = metadata.get(
             "is_used_to_drive_company_metrics"
@@ -68,22 +78,106 @@ class PriorityMetadata:
         return out
 
     def get_priority_urn(self) -> str:
-        return builder.make_tag_urn(f"Priority: {self.get_priority()}")
+        return _PRIORITY_URNS[self.get_priority()]
 
     def get_metadata_for_datahub(self) -> dict[str, str]:
-        keys = {
-            "has downstream dependencies that are reported externally",
-            "has downstream dependencies that are used to drive company metrics",
-            "is reported externally",
-            "is used to drive company metrics",
+        return {
+            "has downstream dependencies that are reported externally": str(
+                self.is_reported_externally
+            ),
+            "has downstream dependencies that are used to drive company metrics": str(
+                self.is_used_to_drive_company_metrics
+            ),
+            "is reported externally": str(self.original_is_reported_externally),
+            "is used to drive company metrics": str(
+                self.original_is_used_to_drive_company_metrics
+            ),
         }
-        vals = {
-            self.is_reported_externally,
-            self.is_used_to_drive_company_metrics,
-            self.original_is_reported_externally,
-            self.original_is_used_to_drive_company_metrics,
-        }
-        return {k: str(v) for k, v in dict(zip(keys, vals)).items()}
+
+
+class PriorityMetadataTable:
+    """
+    The priority metadata of many dbt resources stored as parallel arrays, one entry
+    per resource (struct of arrays). The boolean flags of each resource are packed into
+    a bitmask, so the metadata can be propagated across the whole DAG without touching
+    any PriorityMetadata objects; those are only created on access.
+    """
+
+    def __init__(self, dbt_resources_by_unique_id: dict[str, dict[str, Any]]):
+        self.unique_ids = list(dbt_resources_by_unique_id)
+        self.idx_by_unique_id = {x: i for i, x in enumerate(self.unique_ids)}
+        self.resource_names = [
+            get_resource_name(x) for x in dbt_resources_by_unique_id.values()
+        ]
+        self.original_flags = bytearray(
+            _REPORTED_EXTERNALLY * bool(metadata.get("is_reported_externally"))
+            | _DRIVES_COMPANY_METRICS
+            * bool(metadata.get("is_used_to_drive_company_metrics"))
+            for metadata in map(
+                _get_notion_metadata, dbt_resources_by_unique_id.values()
+            )
+        )
+        self.flags = bytearray(self.original_flags)
+
+    def __len__(self) -> int:
+        return len(self.unique_ids)
+
+    def __getitem__(self, unique_id: str) -> PriorityMetadata:
+        return self._get_priority_metadata(self.idx_by_unique_id[unique_id])
+
+    def to_list(self) -> list[PriorityMetadata]:
+        return [self._get_priority_metadata(i) for i in range(len(self))]
+
+    def _get_priority_metadata(self, i: int) -> PriorityMetadata:
+        original_flags = self.original_flags[i]
+        out = PriorityMetadata(
+            unique_id=self.unique_ids[i],
+            resource_name=self.resource_names[i],
+            is_reported_externally=bool(original_flags & _REPORTED_EXTERNALLY),
+            is_used_to_drive_company_metrics=bool(
+                original_flags & _DRIVES_COMPANY_METRICS
+            ),
+        )
+        out.is_reported_externally = bool(self.flags[i] & _REPORTED_EXTERNALLY)
+        out.is_used_to_drive_company_metrics = bool(
+            self.flags[i] & _DRIVES_COMPANY_METRICS
+        )
+        return out
+
+    def propagate_upstream(self, deps: dict[str, set[str]]) -> None:
+        """
+        Propagate the metadata to all upstream resources. Since we always use 'or' when
+        propagating the boolean flags, we'll always have `true` set for the metadata
+        entries if the resource or at least 1 downstream dep is true.
+        :param deps: unique_id -> the unique_ids of its direct upstream dependencies
+          (see get_dbt_direct_dependencies). Unknown unique_ids (e.g. sources) are
+          ignored.
+        """
+        # direct parents by index
+        parents = [
+            [
+                self.idx_by_unique_id[x]
+                for x in deps[unique_id]
+                if x in self.idx_by_unique_id
+            ]
+            for unique_id in self.unique_ids
+        ]
+
+        # A node is only visited once all of its children have been, so one pass over
+        # the DAG (downstream -> upstream, i.e. Kahn's algorithm) covers every ancestor.
+        flags = self.flags
+        pending_children = [0] * len(self)
+        for node_parents in parents:
+            for parent in node_parents:
+                pending_children[parent] += 1
+        ready = [i for i, n in enumerate(pending_children) if not n]
+        while ready:
+            node = ready.pop()
+            for parent in parents[node]:
+                flags[parent] |= flags[node]
+                pending_children[parent] -= 1
+                if not pending_children[parent]:
+                    ready.append(parent)
 
 
 def generate_priority_metadata(
@@ -97,23 +191,15 @@ def generate_priority_metadata(
     """
     # unique_id : resource
     dbt_resources_by_unique_id: dict[str, dict[str, Any]] = extract_dbt_resources(
-        manifest_file=manifest_file, resource_type_filter=["model", "snapshot"]
+        manifest_file=manifest_file,
+        resource_type_filter=["model", "snapshot"],
+        cache_dir=DEFAULT_CACHE_DIR,
     )
-    # unique_id : dependencies
-    deps: dict[str, ModelDependencies] = get_dbt_dependencies(
+    # unique_id : direct upstream dependencies
+    deps: dict[str, set[str]] = get_dbt_direct_dependencies(
         dbt_resources_by_unique_id=dbt_resources_by_unique_id
     )
 
-    priority_metadata_objs = {
-        unique_id: PriorityMetadata.from_resource(r)
-        for unique_id, r in dbt_resources_by_unique_id.items()
-    }
-    # propagate the metadata to all upstream tables. Since we always use 'or' when
-    # propagating the boolean flags, we'll always have `true` set for the metadata
-    # entries if the table or at least 1 downstream dep is true.
-    for unique_id, priority_metadata_obj in priority_metadata_objs.items():
-        upstream_unique_ids = deps[unique_id].get_all_upstream()
-        for upstream_unique_id in upstream_unique_ids:
-            priority_metadata_objs[upstream_unique_id].propagate(priority_metadata_obj)
-
-    return list(priority_metadata_objs.values())
+    priority_metadata_table = PriorityMetadataTable(dbt_resources_by_unique_id)
+    priority_metadata_table.propagate_upstream(deps)
+    return priority_metadata_table.to_list()
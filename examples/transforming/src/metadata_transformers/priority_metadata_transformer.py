@@ -1,5 +1,6 @@
 from __future__ import annotations
 
+import functools
 import logging
 import os
 from pathlib import Path
@@ -16,6 +17,30 @@ from metadata_transformers.priority_metadata import (
 )
 
 
+@functools.lru_cache(maxsize=None)
+def _get_priority_metadata_by_name(
+    manifest_file: Path, mtime_ns: int
+) -> dict[str, PriorityMetadata]:
+    # resolvers are instantiated more than once during an ingestion, so the resolved
+    # metadata is cached per manifest (mtime_ns invalidates the cache on change)
+    _metadata = generate_priority_metadata(manifest_file)
+    return {x.resource_name: x for x in _metadata}
+
+
+@functools.lru_cache(maxsize=None)
+def _get_priority_properties_by_name(
+    manifest_file: Path, mtime_ns: int
+) -> dict[str, dict[str, str]]:
+    # the metadata does not change once generated, so the properties are only built
+    # once per resource
+    return {
+        name: x.get_metadata_for_datahub()
+        for name, x in _get_priority_metadata_by_name(
+            manifest_file=manifest_file, mtime_ns=mtime_ns
+        ).items()
+    }
+
+
 class PriorityPropertiesResolver(AddDatasetPropertiesResolverBase):
     def __init__(self):
         super().__init__()
@@ -25,19 +50,24 @@ class PriorityPropertiesResolver(AddDatasetPropertiesResolverBase):
                 "must specify the location of the dbt target files with the "
                 "environment variable DBT_TARGET"
             )
-        _metadata = generate_priority_metadata(Path(dbt_target) / "manifest.json")
-        self.priority_metadata_objs: Dict[str, PriorityMetadata] = {
-            x.resource_name: x for x in _metadata
-        }
+        manifest_file = (Path(dbt_target) / "manifest.json").resolve()
+        mtime_ns = manifest_file.stat().st_mtime_ns
+        self.priority_metadata_objs: dict[str, PriorityMetadata] = (
+            _get_priority_metadata_by_name(
+                manifest_file=manifest_file, mtime_ns=mtime_ns
+            )
+        )
+        self._priority_properties_by_name: dict[str, dict[str, str]] = (
+            _get_priority_properties_by_name(
+                manifest_file=manifest_file, mtime_ns=mtime_ns
+            )
+        )
 
-    def get_properties_to_add(self, entity_urn: str) -> Dict[str, str]:
+    def get_properties_to_add(self, entity_urn: str) -> dict[str, str]:
         logger = logging.getLogger(__name__)
         dataset_key: DatasetKeyClass = builder.dataset_urn_to_key(entity_urn)
-        priority_metadata_obj: PriorityMetadata = self.priority_metadata_objs.get(
-            dataset_key.name
-        )
-        if priority_metadata_obj:
-            priority_properties = priority_metadata_obj.get_metadata_for_datahub()
+        priority_properties = self._priority_properties_by_name.get(dataset_key.name)
+        if priority_properties:
             logger.info("urn: %s - %s", entity_urn, dataset_key.name)
             logger.info("Adding properties: %s", priority_properties)
         else:
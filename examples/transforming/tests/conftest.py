@@ -0,0 +1,5 @@
+import sys
+from pathlib import Path
+
+# the example is not installed next to datahub_tools, so it is imported from its source
+sys.path.insert(0, str(Path(__file__).parents[1] / "src"))
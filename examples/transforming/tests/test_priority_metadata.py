@@ -0,0 +1,76 @@
+from metadata_transformers.priority_metadata import (
+    PriorityMetadata,
+    PriorityMetadataTable,
+)
+
+from datahub_tools.dbt import get_dbt_direct_dependencies
+
+
+def _resource(unique_id, depends_on=(), **notion_metadata):
+    return {
+        "unique_id": unique_id,
+        "database": "db",
+        "schema": "sch",
+        "alias": None,
+        "name": unique_id.rsplit(".", 1)[-1],
+        "config": {"notion_metadata": notion_metadata},
+        "depends_on": {"nodes": list(depends_on)},
+    }
+
+
+def test_propagate_upstream():
+    resources = [
+        # diamond: d depends on b and c, which both depend on a
+        _resource("model.a", depends_on=["source.s"]),
+        _resource("model.b", depends_on=["model.a"]),
+        _resource("model.c", depends_on=["model.a"]),
+        _resource("model.d", ["model.b", "model.c"], is_reported_externally=True),
+        # chain: g -> f -> e
+        _resource("model.e"),
+        _resource("model.f", depends_on=["model.e"]),
+        _resource("model.g", ["model.f"], is_used_to_drive_company_metrics=True),
+    ]
+    resources_by_unique_id = {x["unique_id"]: x for x in resources}
+
+    table = PriorityMetadataTable(resources_by_unique_id)
+    # the sources (not in the table) are ignored
+    table.propagate_upstream(get_dbt_direct_dependencies(resources_by_unique_id))
+
+    assert {x.unique_id: x.get_priority() for x in table.to_list()} == {
+        "model.a": "P0",
+        "model.b": "P0",
+        "model.c": "P0",
+        "model.d": "P0",
+        "model.e": "P1",
+        "model.f": "P1",
+        "model.g": "P1",
+    }
+    # only the propagated flags change, not the original ones
+    assert table["model.a"].resource_name == "db.sch.a"
+    assert not table["model.a"].original_is_reported_externally
+    assert table["model.d"].original_is_reported_externally
+
+
+def test_get_metadata_for_datahub():
+    metadata = PriorityMetadata(
+        unique_id="model.a",
+        resource_name="db.sch.a",
+        is_reported_externally=False,
+        is_used_to_drive_company_metrics=True,
+    )
+    metadata.propagate(
+        PriorityMetadata(
+            unique_id="model.b",
+            resource_name="db.sch.b",
+            is_reported_externally=True,
+            is_used_to_drive_company_metrics=False,
+        )
+    )
+
+    # each value is paired with its own key
+    assert metadata.get_metadata_for_datahub() == {
+        "has downstream dependencies that are reported externally": "True",
+        "has downstream dependencies that are used to drive company metrics": "True",
+        "is reported externally": "False",
+        "is used to drive company metrics": "True",
+    }
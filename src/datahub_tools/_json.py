@@ -0,0 +1,26 @@
+"""
+JSON encoding/decoding with orjson (the optional `fast` extra) when it is installed,
+falling back on the standard library otherwise.
+"""
+
+from __future__ import annotations
+
+import json
+from typing import Any
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def dumps(obj: Any) -> bytes:
+    if orjson:
+        return orjson.dumps(obj)
+    return json.dumps(obj).encode()
+
+
+def loads(data: bytes | str) -> Any:
+    if orjson:
+        return orjson.loads(data)
+    return json.loads(data)
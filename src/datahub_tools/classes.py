@@ -1,28 +1,47 @@
 from __future__ import annotations
 
 import logging
-import subprocess
 from collections import defaultdict
-from dataclasses import dataclass
+from collections.abc import Iterable
+from dataclasses import dataclass, field
 from typing import Any
 
 import datahub.emitter.mce_builder as builder
-import jmespath
+
+logger = logging.getLogger(__name__)
 
 
 class DataHubError(ValueError):
     pass
 
 
+def _deep_get(_dict: Any, *keys: str) -> Any:
+    """
+    Equivalent to jmespath.search("key1.key2...", _dict) for a fixed path of keys (None
+    if any part of the path is missing or null), without the cost of parsing the
+    expression on every call.
+    """
+    for key in keys:
+        if not isinstance(_dict, dict):
+            return None
+        _dict = _dict.get(key)
+    return _dict
+
+
 # generic DH class
+# note: __slots__ are declared by hand (instead of dataclass(slots=True)) to support
+# python 3.9. They must list every field of the class (excluding inherited fields).
 @dataclass
 class DH:
+    __slots__ = ("name", "urn")
     name: str
     urn: str
 
 
 @dataclass
 class DHTag(DH):
+    __slots__ = ()
+
     def is_dbt(self) -> bool:
         return self.urn.startswith("urn:li:tag:dbt")
 
@@ -30,11 +49,17 @@ class DHTag(DH):
         return self.urn.startswith("urn:li:tag:Priority")
 
     def get_priority(self) -> str | None:
-        return self.name.rsplit(" ")[1] if self.is_priority() else None
+        if not self.is_priority():
+            return None
+        # e.g. "Priority: P0"; the urn carries it too, for tags without a name (no
+        # properties). None if the priority is missing
+        parts = (self.name or self.urn).split()
+        return parts[1] if len(parts) > 1 else None
 
 
 @dataclass
 class DHEntityField:
+    __slots__ = ("name", "type", "description", "tags", "glossary_terms")
     name: str
     type: str | None
     description: str | None
@@ -44,17 +69,35 @@ class DHEntityField:
     @classmethod
     def from_dict(cls, _dict: dict) -> DHEntityField:
         # documentation at https://datahubproject.io/docs/graphql/objects#schemafield
-        return DHEntityField(
-            name=_dict["fieldPath"],
-            type=_dict.get("type"),
-            description=_dict["description"],
-            tags=_dict["tags"],
-            glossary_terms=_dict["glossaryTerms"],
+        # (positional arguments: name, type, description, tags, glossary_terms, as this
+        # is called for every field of every entity). Only fieldPath is always queried,
+        # see get_datahub_entities' with_schema.
+        return cls(
+            _dict["fieldPath"],
+            _dict.get("type"),
+            _dict.get("description"),
+            _dict.get("tags"),
+            _dict.get("glossaryTerms"),
         )
 
 
+class _DHEntitySlots(DH):
+    # the slot of DHEntity.priority: a slot can't be declared in the same class as the
+    # field(...) of a dataclass field, which dataclass then removes (no default)
+    __slots__ = ("priority",)
+
+
 @dataclass(frozen=False, unsafe_hash=True)
-class DHEntity(DH):
+class DHEntity(_DHEntitySlots):
+    __slots__ = (
+        "description",
+        "editable_description",
+        "fields",
+        "editable_fields",
+        "metadata",
+        "owners",
+        "tags",
+    )
     description: str | None
     editable_description: str | None
     fields: list[DHEntityField]
@@ -63,6 +106,26 @@ class DHEntity(DH):
     metadata: dict[str, str] | None
     owners: dict[str, list[str]] | None
     tags: list[DHTag] | None
+    # derived from the tags whenever they are assigned, see get_priority. Note that
+    # changing the list of tags in place (e.g. entity.tags.append(...)) is not seen,
+    # assign the tags instead (e.g. entity.tags = [*entity.tags, tag])
+    priority: str | None = field(init=False, repr=False, compare=False)
+
+    def __setattr__(self, name: str, value: Any):
+        super().__setattr__(name, value)
+        if name == "tags":
+            super().__setattr__("priority", self._priority_from_tags())
+
+    def _priority_from_tags(self) -> str | None:
+        priorities = [x.get_priority() for x in self.tags or [] if x.is_priority()]
+        priorities = [x for x in priorities if x]
+        if len(priorities) > 1:
+            logger.warning(
+                "%s has more than one priority tag (%s), using the first one",
+                self.urn,
+                ", ".join(priorities),
+            )
+        return priorities[0] if priorities else None
 
     def has_tags(self) -> bool:
         return bool(self.tags)
@@ -81,65 +144,66 @@ class DHEntity(DH):
         return the priority of the dataset, as reflected by its tags (priority tags look like `Priority: P0`)
         :return:
         """
-        set_priorities = [x for x in self.tags if x.is_priority()]
-        if set_priorities:
-            assert len(set_priorities) == 1
-            priority_tag = set_priorities[0].get_priority()
-        else:
-            priority_tag = None
-
-        return priority_tag
+        return self.priority
 
     def delete(self, force: bool = True):
-        logger = logging.getLogger(__name__)
-        logger.info("attempting to delete %s (%s)", self.name, self.urn)
-        args = ["datahub", "delete", "--urn", self.urn, "--hard"]
-        if force:
-            args.append("-f")
-        logger.info("sending command: %s", " ".join(args))
-        output = subprocess.run(args=args, input="y\n", text=True)
-        logger.info("Done: datahub return code %d", output.returncode)
+        DHEntity.delete_many([self], force=force)
+
+    @classmethod
+    def delete_many(cls, entities: Iterable[DHEntity], force: bool = True):
+        """
+        Hard delete the given entities using a single DataHub client, instead of running
+        the datahub CLI (one python process) for every entity.
+        :param entities: the entities to delete
+        :param force: kept for backwards compatibility; the CLI needed it to skip the
+          confirmation prompt, deleting in-process never prompts.
+        """
+        # imported here to avoid a circular import (client imports this module)
+        from .client import get_dh_graph
+
+        graph = get_dh_graph()
+        for entity in entities:
+            logger.info("attempting to delete %s (%s)", entity.name, entity.urn)
+            rows, timeseries_rows = graph.hard_delete_entity(urn=entity.urn)
+            logger.info(
+                "Done: deleted %d rows and %d timeseries rows",
+                rows,
+                timeseries_rows,
+            )
 
     @classmethod
     def from_dict(cls, _dict: dict[str, Any]):
         # used to parse the results from query to the graphql search endpoint
-        raw_owners = jmespath.search("ownership.owners", _dict) or []
+        raw_owners = _deep_get(_dict, "ownership", "owners") or []
         owner_urns_by_type = defaultdict(list)
 
         for raw_owner in raw_owners:
-            owner_type = jmespath.search("ownershipType.info.name", raw_owner)
-            owner_urns = owner_urns_by_type[owner_type]
-            owner_urns.append(raw_owner["owner"]["urn"])
-            if owner_type not in owner_urns_by_type:
-                owner_urns_by_type[owner_type] = owner_urns
+            owner_type = _deep_get(raw_owner, "ownershipType", "info", "name")
+            owner_urns_by_type[owner_type].append(raw_owner["owner"]["urn"])
 
         # the API docs say that the qualifiedName is the best source for the name
         # and to not use `name`. However, some entities do not have a qualified name,
         # so we need fallback.
-        entity_name = (
-            jmespath.search("properties.qualifiedName", _dict) or _dict["name"]
-        )
-        description = jmespath.search("properties.description", _dict)
-        editable_description = jmespath.search("editableProperties.description", _dict)
+        properties = _dict.get("properties") or {}
+        entity_name = properties.get("qualifiedName") or _dict["name"]
+        description = properties.get("description")
+        editable_description = _deep_get(_dict, "editableProperties", "description")
 
-        raw_tags = jmespath.search("tags.tags", _dict) or []
+        raw_tags = _deep_get(_dict, "tags", "tags") or []
         tags = [
-            DHTag(
-                urn=tag["tag"]["urn"], name=jmespath.search("tag.properties.name", tag)
-            )
-            for tag in raw_tags
+            DHTag(urn=tag["urn"], name=_deep_get(tag, "properties", "name"))
+            for tag in (x["tag"] for x in raw_tags)
         ]
 
-        raw_fields = jmespath.search("schemaMetadata.fields", _dict) or []
+        raw_fields = _deep_get(_dict, "schemaMetadata", "fields") or []
         fields = [DHEntityField.from_dict(x) for x in raw_fields]
 
         raw_editable_fields = (
-            jmespath.search("editableSchemaMetadata.editableSchemaFieldInfo", _dict)
-            or []
+            _deep_get(_dict, "editableSchemaMetadata", "editableSchemaFieldInfo") or []
         )
         editable_fields = [DHEntityField.from_dict(x) for x in raw_editable_fields]
 
-        raw_metadata = jmespath.search("properties.customProperties", _dict) or []
+        raw_metadata = properties.get("customProperties") or []
         raw_metadata = {x["key"]: x["value"] for x in raw_metadata}
 
         return DHEntity(
@@ -4,20 +4,63 @@ import functools
 import logging
 import os
 import re
-from collections.abc import Iterable
+import threading
+import time
+from collections.abc import Callable, Hashable, Iterable, Iterator
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from string import Template
 from textwrap import dedent
+from typing import Any
 
 import jmespath
 import requests
+from datahub.emitter.mce_builder import make_data_platform_urn
 from datahub.emitter.mcp import MetadataChangeProposalWrapper
 from datahub.emitter.rest_emitter import DatahubRestEmitter
 from datahub.metadata.schema_classes import ChangeTypeClass, DatasetPropertiesClass
+from datahub.specific.dataset import DatasetPatchBuilder
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
+from . import _json
 from .classes import DataHubError, DHEntity
 
+try:
+    import ijson
+except ImportError:
+    ijson = None
+
+logger = logging.getLogger(__name__)
+
 BUSINESS_OWNER = "urn:li:ownershipType:__system__business_owner"
 TECHNICAL_OWNER = "urn:li:ownershipType:__system__technical_owner"
+# the maximum number of results DataHub's search endpoint returns per request
+_MAX_SEARCH_COUNT = 10000
+# the maximum number of aliased mutations sent in a single request
+_MAX_MUTATIONS_PER_REQUEST = 50
+# the maximum number of aliased queries sent in a single request
+_MAX_QUERIES_PER_REQUEST = 50
+# the maximum number of resources given to a single batch* mutation, beyond that the
+# resources are split across several (aliased) mutations
+_MAX_RESOURCES_PER_MUTATION = 200
+# see get_datahub_entities(cache_ttl=...)
+_ENTITIES_CACHE: dict[Hashable, tuple[float, list[DHEntity]]] = {}
+_MAX_CACHED_ENTITY_LISTS = 8
+# see _cached_post
+_RESPONSE_CACHE: dict[Hashable, tuple[float, dict]] = {}
+_MAX_CACHED_RESPONSES = 256
+# guards the caches above, which are shared by the threads of max_workers
+_CACHE_LOCK = threading.Lock()
+# the GraphQL input type of each mutation endpoint sent through _post_mutation(s)
+_MUTATION_INPUT_TYPES = {
+    "updateDataset": "DatasetUpdateInput",
+    "batchAssignRole": "BatchAssignRoleInput",
+    "batchAddOwners": "BatchAddOwnersInput",
+    "batchRemoveOwners": "BatchRemoveOwnersInput",
+    "batchAddTags": "BatchAddTagsInput",
+    "batchRemoveTags": "BatchRemoveTagsInput",
+    "updateDescription": "DescriptionUpdateInput",
+}
 
 
 def _wrapped_getenv(token) -> str:
@@ -27,38 +70,66 @@ def _wrapped_getenv(token) -> str:
     return out
 
 
+# the environment variables are only read once (use e.g. get_dh_token.cache_clear() to
+# read them again). Note that missing variables are not cached.
+@functools.lru_cache(maxsize=1)
 def get_dh_token() -> str:
     return _wrapped_getenv("DATAHUB_GMS_TOKEN")
 
 
+@functools.lru_cache(maxsize=1)
 def get_dh_server() -> str:
     return _wrapped_getenv("DATAHUB_GMS_URL")
 
 
+@functools.lru_cache(maxsize=1)
 def get_dh_graphql_url() -> str:
     return _wrapped_getenv("DATAHUB_GRAPHQL_URL")
 
 
+@functools.lru_cache(maxsize=None)
+def get_dh_session() -> requests.Session:
+    """
+    The session used to POST to DataHub's GraphQL endpoint. It is shared so that
+    connections are kept alive and reused across requests. Requests that fail to connect
+    or get a 502/503/504 (e.g. DataHub restarting, or briefly overloaded) are retried a
+    few times.
+    """
+    session = requests.Session()
+    session.headers.update(
+        {
+            "Accept": "application/json",
+            "Content-Type": "application/json",
+            "Authorization": f"Bearer {get_dh_token()}",
+        }
+    )
+    # POSTs are retried too: GraphQL queries are all POSTs, and the mutations sent by this
+    # module (add/remove tags/owners, set descriptions, ...) can safely be applied twice.
+    # raise_on_status=False so that datahub_post's raise_for_status reports the last
+    # response as usual.
+    retry = Retry(
+        total=3,
+        backoff_factor=0.2,
+        status_forcelist=(502, 503, 504),
+        allowed_methods=frozenset({"POST"}),
+        raise_on_status=False,
+    )
+    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=32, max_retries=retry)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
 def datahub_post(body: dict) -> dict:
     """
     Convenience function for sending POSTs to DataHub's GraphQL endpoint
     """
-    headers = {
-        "Accept": "application/json",
-        "Content-Type": "application/json",
-        "Authorization": f"Bearer {get_dh_token()}",
-    }
-
     graphql_url = get_dh_graphql_url()
-    logger = logging.getLogger(__name__)
-    # the sub just condenses down the body e.g.: 'query: \n       {...' -> 'query: {...'
-    # Note that the extra backslash is needed (\\n+) because body is a dict and calling
-    # str will inject additional escape characters.
-    logger.info("posting to %s: %s", graphql_url, re.sub(r"\\n+\s*", "", str(body)))
+    _log_post(graphql_url=graphql_url, body=body)
 
-    response = requests.post(url=graphql_url, headers=headers, json=body)
+    response = get_dh_session().post(url=graphql_url, data=_json.dumps(body))
     response.raise_for_status()
-    out = response.json()
+    out = _json.loads(response.content)
 
     if "errors" in out:
         raise DataHubError(out)
@@ -66,6 +137,140 @@ def datahub_post(body: dict) -> dict:
         return out
 
 
+def _get_cached(
+    cache: dict[Hashable, tuple[float, Any]],
+    key: Hashable,
+    ttl: float,
+    fetch: Callable[[], Any],
+    maxsize: int,
+) -> Any:
+    """
+    Return the value cached under key, if it has not expired, otherwise fetch (and
+    cache) it. The oldest entries are evicted beyond maxsize.
+    :param cache: key -> (expiry, as per time.monotonic(), value)
+    """
+    now = time.monotonic()
+    with _CACHE_LOCK:
+        cached = cache.get(key)
+    if cached and cached[0] > now:
+        return cached[1]
+
+    # fetched without holding the lock, so that the threads of max_workers don't wait
+    # for each other
+    value = fetch()
+    with _CACHE_LOCK:
+        cache.pop(key, None)
+        cache[key] = (now + ttl, value)
+        while len(cache) > maxsize:
+            del cache[next(iter(cache))]
+    return value
+
+
+def _clear_cache(cache: dict):
+    with _CACHE_LOCK:
+        cache.clear()
+
+
+def _cached_post(body: dict, ttl: float | None) -> dict:
+    """
+    datahub_post, with the response cached in memory for ttl seconds (if not None). Only
+    for read-only queries; any mutation sent through this module clears that cache (see
+    also clear_response_cache).
+    """
+    if ttl is None:
+        return datahub_post(body=body)
+    return _get_cached(
+        cache=_RESPONSE_CACHE,
+        key=(get_dh_graphql_url(), _json.dumps(body)),
+        ttl=ttl,
+        fetch=functools.partial(datahub_post, body=body),
+        maxsize=_MAX_CACHED_RESPONSES,
+    )
+
+
+def clear_response_cache():
+    """
+    Clear the responses cached by the `cache_ttl` argument of the read-only functions
+    (e.g. get_owners, get_glossary_terms, get_datahub_users), e.g. after changing
+    DataHub by other means than this module
+    """
+    _clear_cache(_RESPONSE_CACHE)
+
+
+def datahub_post_stream(body: dict, item_prefix: str) -> Iterator[Any]:
+    """
+    Like datahub_post, but the response is parsed as it is received and only the values
+    found at item_prefix are yielded, one at a time (e.g. with
+    "data.search.searchResults.item", each search result). This way, the whole response
+    never needs to be held in memory. Requires ijson (the `stream` extra).
+    :param body: see datahub_post
+    :param item_prefix: the ijson prefix of the values to yield
+    """
+    graphql_url = get_dh_graphql_url()
+    _log_post(graphql_url=graphql_url, body=body)
+
+    with get_dh_session().post(
+        url=graphql_url, data=_json.dumps(body), stream=True
+    ) as response:
+        response.raise_for_status()
+        response.raw.decode_content = True
+        errors = None
+        events = ijson.parse(response.raw, use_float=True)
+        for prefix, value in _iter_json_values(events, (item_prefix, "errors")):
+            if prefix == "errors":
+                errors = value
+            else:
+                yield value
+
+    if errors:
+        raise DataHubError({"errors": errors})
+
+
+def _iter_json_values(
+    events: Iterable[tuple[str, str, Any]], prefixes: Iterable[str]
+) -> Iterator[tuple[str, Any]]:
+    """
+    Build and yield the (prefix, value) of every value of the ijson event stream found
+    at one of the given prefixes.
+    """
+    prefixes = set(prefixes)
+    builder = None
+    builder_prefix = None
+    depth = 0
+    for prefix, event, value in events:
+        if builder is not None:
+            builder.event(event, value)
+            if event in ("start_map", "start_array"):
+                depth += 1
+            elif event in ("end_map", "end_array"):
+                depth -= 1
+                if not depth:
+                    yield builder_prefix, builder.value
+                    builder = None
+        elif prefix in prefixes and event != "map_key":
+            if event in ("start_map", "start_array"):
+                builder = ijson.ObjectBuilder()
+                builder.event(event, value)
+                builder_prefix = prefix
+                depth = 1
+            else:
+                yield prefix, value
+
+
+# condenses down the logged body e.g.: 'query: \n       {...' -> 'query: {...'
+# Note that the extra backslash is needed (\\n+) because body is a dict and calling str
+# will inject additional escape characters.
+_LOG_SQUASH_RE = re.compile(r"\\n+\s*")
+
+
+def _log_post(graphql_url: str, body: dict):
+    logger.info("posting to %s", graphql_url)
+    # the body can be large (many KB for batched mutations), only format it when needed
+    if not logger.isEnabledFor(logging.DEBUG):
+        return
+    logger.debug("request body: %s", _LOG_SQUASH_RE.sub("", str(body)))
+
+
 @functools.lru_cache(maxsize=None)
 def get_dh_emitter():
     return DatahubRestEmitter(
@@ -74,6 +279,51 @@ def get_dh_emitter():
     )
 
 
+@functools.lru_cache(maxsize=None)
+def get_dh_graph():
+    # imported lazily since the graph client pulls in a large part of the datahub SDK
+    from datahub.ingestion.graph.client import DatahubClientConfig, DataHubGraph
+
+    return DataHubGraph(
+        DatahubClientConfig(server=get_dh_server(), token=get_dh_token())
+    )
+
+
+def _build_metadata_event(
+    metadata: dict[str, str],
+    resource_urn: str,
+    cast_to_str: bool = False,
+    sort: bool = True,
+) -> MetadataChangeProposalWrapper:
+    # the (optional) cast and sort are done on a single list of items, which is only
+    # turned back into a dict once
+    if cast_to_str:
+        # no need to validate, everything is a string once cast
+        items = [(str(k), str(v)) for k, v in metadata.items()]
+    else:
+        items = list(metadata.items())
+        for k, v in items:
+            if not (isinstance(k, str) and isinstance(v, str)):
+                raise ValueError(
+                    "metadata must be of type dict[str, str] (only strings allowed), got "
+                    f"{k!r}: {v!r} for {resource_urn}. Either fix the data, or use the arg "
+                    "cast_to_str=True to str() wrap all keys and value."
+                )
+
+    if sort:
+        # keys are unique, so the tuples are only ever compared by key
+        items.sort()
+    custom_properties = dict(items)
+
+    return MetadataChangeProposalWrapper(
+        entityType="dataset",
+        changeType=ChangeTypeClass.UPSERT,
+        entityUrn=resource_urn,
+        aspectName="datasetProperties",
+        aspect=DatasetPropertiesClass(customProperties=custom_properties),
+    )
+
+
 def emit_metadata(
     metadata: dict[str, str],
     resource_urn: str,
@@ -89,61 +339,384 @@ def emit_metadata(
     :param sort: Metadata are sorted by key, by default
     :return:
     """
-    logger = logging.getLogger(__name__)
     logger.info("Emitting metadata %s to table %s", metadata, resource_urn)
 
-    emitter = get_dh_emitter()
+    emit_metadata_batch(
+        items=[(resource_urn, metadata)], cast_to_str=cast_to_str, sort=sort
+    )
+
 
-    _metadata = (
-        {str(k): str(v) for k, v in metadata.items()} if cast_to_str else metadata
+def emit_metadata_patch(
+    resource_urn: str,
+    add: dict[str, str] | None = None,
+    remove: Iterable[str] | None = None,
+):
+    """
+    Emit only the changes to a resource's metadata (aka custom properties), as a patch.
+    Unlike emit_metadata, the resource's other metadata are left untouched and do not
+    need to be sent (or known).
+    :param resource_urn:
+    :param add: metadata to add or overwrite
+    :param remove: keys of the metadata to remove
+    :return:
+    """
+    logger.info(
+        "Patching metadata of table %s: add %s, remove %s", resource_urn, add, remove
     )
 
-    if not all(isinstance(k, str) and isinstance(v, str) for k, v in _metadata.items()):
-        raise ValueError(
-            "metadata must be of type dict[str, str] (only strings allowed). Either fix the data, or use "
-            "the arg cast_to_str=True to str() wrap all keys and value."
+    emit_metadata_patches(items=[(resource_urn, add, remove)])
+
+
+def emit_metadata_patches(
+    items: Iterable[tuple[str, dict[str, str] | None, Iterable[str] | None]],
+):
+    """
+    Emit the metadata patches of many resources/entities through a single, shared
+    emitter, in a single request when the installed datahub package supports it
+    (emit_mcps).
+    :param items: (resource_urn, add, remove) triples, see emit_metadata_patch
+    :return:
+    """
+    metadata_events = []
+    for resource_urn, add, remove in items:
+        patch_builder = DatasetPatchBuilder(urn=resource_urn)
+        for key in remove or ():
+            patch_builder.remove_custom_property(key)
+        for key, value in (add or {}).items():
+            patch_builder.add_custom_property(key, value)
+        metadata_events.extend(patch_builder.build())
+    logger.info("Patching metadata of %d tables", len(metadata_events))
+
+    _emit_events(metadata_events)
+
+
+def emit_metadata_batch(
+    items: Iterable[tuple[str, dict[str, str]]],
+    cast_to_str: bool = False,
+    sort: bool = True,
+):
+    """
+    Emit metadata for many resources/entities through a single, shared emitter, in
+    a single request when the installed datahub package supports it (emit_mcps). All
+    metadata is validated before anything is sent, so a bad entry will not leave the
+    batch half-emitted.
+    :param items: (resource_urn, metadata) pairs, see emit_metadata
+    :param cast_to_str: see emit_metadata
+    :param sort: see emit_metadata
+    :return:
+    """
+    metadata_events = [
+        _build_metadata_event(
+            metadata=metadata,
+            resource_urn=resource_urn,
+            cast_to_str=cast_to_str,
+            sort=sort,
         )
+        for resource_urn, metadata in items
+    ]
+    logger.info("Emitting metadata to %d tables", len(metadata_events))
 
-    # noinspection PyTypeChecker
-    custom_properties = (
-        dict(sorted(_metadata.items(), key=lambda x: x[0])) if sort else _metadata
-    )
+    _emit_events(metadata_events)
 
-    metadata_event = MetadataChangeProposalWrapper(
-        entityType="dataset",
-        changeType=ChangeTypeClass.UPSERT,
-        entityUrn=resource_urn,
-        aspectName="datasetProperties",
-        aspect=DatasetPropertiesClass(customProperties=custom_properties),
-    )
 
-    emitter.emit(metadata_event)
+def _emit_events(metadata_events: list[MetadataChangeProposalWrapper]):
+    emitter = get_dh_emitter()
+    if hasattr(emitter, "emit_mcps"):
+        emitter.emit_mcps(metadata_events)
+    else:
+        # older versions of the datahub package can only emit one event at a time
+        for metadata_event in metadata_events:
+            emitter.emit(metadata_event)
 
 
 def get_datahub_entities(
     start: int = 0,
     limit: int | None = None,
-    with_schema: bool = False,
+    with_schema: bool | Iterable[str] = False,
     chunk_size: int | None = None,
     resource_urns: list[str] | None = None,
+    name_filter: Iterable[str] | None = None,
+    parse_workers: int | None = None,
+    platform: str | None = None,
+    max_workers: int = 1,
+    cache_ttl: float | None = None,
+    scroll: bool = False,
 ) -> list[DHEntity]:
     """
     :param start: Index of the first record to return
     :param limit: Maximum number of records to query
     :param with_schema: If True (default is False) then schema fields and descriptions
       will be retrieved (warning: may be slow or cause the DataHub endpoint to 503, in
-      which case you will need to retrieve your entities in chunks).
+      which case you will need to retrieve your entities in chunks). To only retrieve
+      some parts of each schema field (besides its name), and get a smaller, faster
+      response, pass them instead e.g. {"description"}; the parts are description,
+      tags, glossaryTerms and type (the parts that are not retrieved are None).
     :param chunk_size: If provided, the entities will be retrieved in chunks of this
-      size.
+      size (also applies to resource_urns, which are otherwise all sent in one request).
+      When ijson (the `stream` extra) is installed, and neither max_workers nor
+      parse_workers are used, each chunk is parsed as it is received.
     :param resource_urns: Optional list of dataset resource_urns
+    :param name_filter: Optional collection of names (e.g. prep.core.calendar). If
+      provided, only the entities with one of these names (see DHEntity.name) are
+      returned. The names are matched once the entities are received, as not every
+      source sets the qualifiedName DataHub can search on (e.g. dbt), so combine it
+      with platform to limit what is fetched. Note that limit applies before this
+      filter. Ignored when resource_urns is provided.
+    :param parse_workers: If provided, the retrieved entities are parsed into DHEntity
+      objects by a pool of this many processes, once all pages have been fetched. Only
+      worth it for very large numbers of entities (process startup and pickling are not
+      free), so by default entities are parsed in this process.
+    :param platform: Optional platform (e.g. dbt, or its urn urn:li:dataPlatform:dbt).
+      If provided, DataHub will only return the entities of this platform. Ignored when
+      resource_urns is provided.
+    :param max_workers: By default, pages (see chunk_size) are fetched one after the
+      other. If greater than 1, the pages after the first one (or all the chunks of
+      resource_urns) are fetched concurrently by this many threads. Keep it at or below
+      the connection pool size of get_dh_session (32).
+    :param cache_ttl: If provided, the entities are cached in memory for this many
+      seconds and identical calls (same DataHub instance and arguments) within that time
+      return them without querying DataHub again. Note that the cached DHEntity objects
+      are shared between those calls. Clear the cache with
+      get_datahub_entities.cache_clear().
+    :param scroll: If True, page with DataHub's scrollAcrossEntities endpoint instead of
+      search: each page continues from where the previous one ended, instead of DataHub
+      skipping over `start` results for every page (which gets slow deep into large
+      catalogs). Not compatible with start (nor max_workers, pages are then fetched
+      one after the other).
     :return: dictionary of snowflake name (e.g. prep.core.calendar) to DataHub urn
       e.g. urn:li:dataset:(urn:li:dataPlatform:snowflake,prep.core.calendar,PROD)
     """
-    # reuse the same set of vars for fields (editable and non-editable fields)
-    field_vars = dedent(
+    with_schema = _schema_fields(with_schema)
+    fetch = functools.partial(
+        _fetch_datahub_entities,
+        start=start,
+        limit=limit,
+        with_schema=with_schema,
+        chunk_size=chunk_size,
+        resource_urns=resource_urns,
+        name_filter=name_filter,
+        parse_workers=parse_workers,
+        platform=platform,
+        max_workers=max_workers,
+        scroll=scroll,
+    )
+    if cache_ttl is None:
+        return fetch()
+
+    # parse_workers and max_workers don't change the result, so they are not part of
+    # the key
+    key = (
+        get_dh_graphql_url(),
+        start,
+        limit,
+        with_schema,
+        chunk_size,
+        tuple(resource_urns) if resource_urns else None,
+        frozenset(name_filter) if name_filter is not None else None,
+        platform,
+    )
+    return list(
+        _get_cached(
+            cache=_ENTITIES_CACHE,
+            key=key,
+            ttl=cache_ttl,
+            fetch=fetch,
+            maxsize=_MAX_CACHED_ENTITY_LISTS,
+        )
+    )
+
+
+get_datahub_entities.cache_clear = functools.partial(_clear_cache, _ENTITIES_CACHE)
+
+
+def _fetch_datahub_entities(
+    start: int,
+    limit: int | None,
+    with_schema: frozenset[str],
+    chunk_size: int | None,
+    resource_urns: list[str] | None,
+    name_filter: Iterable[str] | None,
+    parse_workers: int | None,
+    platform: str | None,
+    max_workers: int,
+    scroll: bool = False,
+) -> list[DHEntity]:
+    if resource_urns:
+        raw_entities = _get_raw_entities_by_urn(
+            resource_urns=resource_urns,
+            with_schema=with_schema,
+            chunk_size=chunk_size or len(resource_urns),
+            max_workers=max_workers,
+        )
+        return _parse_entities(raw_entities=raw_entities, parse_workers=parse_workers)
+
+    if ijson and max_workers <= 1 and not parse_workers and not scroll:
+        # stream the responses: each entity is parsed as soon as it is received, so that
+        # the JSON of a whole page is never held in memory
+        return list(
+            iter_datahub_entities(
+                start=start,
+                limit=limit,
+                with_schema=with_schema,
+                chunk_size=chunk_size,
+                name_filter=name_filter,
+                platform=platform,
+            )
+        )
+
+    if name_filter is not None:
+        name_filter = frozenset(name_filter)
+        if not name_filter:
+            # an empty filter can't match anything
+            return []
+    or_filters = _build_or_filters(
+        platform=[make_data_platform_urn(platform)] if platform else None,
+    )
+
+    if scroll:
+        pages = _scroll_raw_entity_pages(
+            with_schema=with_schema,
+            or_filters=or_filters,
+            start=start,
+            limit=limit,
+            chunk_size=chunk_size or _MAX_SEARCH_COUNT,
+        )
+    else:
+        pages = _search_raw_entity_pages(
+            with_schema=with_schema,
+            or_filters=or_filters,
+            start=start,
+            limit=limit,
+            chunk_size=chunk_size or _MAX_SEARCH_COUNT,
+            max_workers=max_workers,
+        )
+    if parse_workers:
+        raw_entities = [x for page in pages for x in page]
+        entities = _parse_entities(
+            raw_entities=raw_entities, parse_workers=parse_workers
+        )
+    else:
+        # parse the pages as they are received, so that only one page of raw entities
+        # is held in memory (next to the parsed ones) at any time
+        entities = (DHEntity.from_dict(_dict=x) for page in pages for x in page)
+    return [x for x in entities if name_filter is None or x.name in name_filter]
+
+
+def iter_datahub_entities(
+    start: int = 0,
+    limit: int | None = None,
+    with_schema: bool | Iterable[str] = False,
+    chunk_size: int | None = None,
+    name_filter: Iterable[str] | None = None,
+    platform: str | None = None,
+    scroll: bool = False,
+) -> Iterator[DHEntity]:
+    """
+    Like get_datahub_entities, but the entities are yielded one at a time as they are
+    received. When ijson (the `stream` extra) is installed, the responses are also
+    parsed as they are received, so that only one page's worth of entities (instead of
+    all of them, as JSON and as DHEntity objects) is ever held in memory.
+    See get_datahub_entities for the arguments.
+    """
+    with_schema = _schema_fields(with_schema)
+    if name_filter is not None:
+        name_filter = frozenset(name_filter)
+        if not name_filter:
+            # an empty filter can't match anything
+            return
+    or_filters = _build_or_filters(
+        platform=[make_data_platform_urn(platform)] if platform else None,
+    )
+
+    for raw_entity in _iter_raw_entities(
+        with_schema=with_schema,
+        or_filters=or_filters,
+        start=start,
+        limit=limit,
+        chunk_size=chunk_size or _MAX_SEARCH_COUNT,
+        scroll=scroll,
+    ):
+        entity = DHEntity.from_dict(_dict=raw_entity)
+        if name_filter is None or entity.name in name_filter:
+            yield entity
+
+
+def _iter_raw_entities(
+    with_schema: frozenset[str],
+    or_filters: list[dict] | None,
+    start: int,
+    limit: int | None,
+    chunk_size: int,
+    scroll: bool,
+) -> Iterator[dict]:
+    if scroll:
+        for page in _scroll_raw_entity_pages(
+            with_schema=with_schema,
+            or_filters=or_filters,
+            start=start,
+            limit=limit,
+            chunk_size=chunk_size,
+        ):
+            yield from page
+        return
+
+    cursor = start
+    remaining = limit or float("inf")
+
+    while remaining > 0:
+        count = int(min(remaining, chunk_size))
+        n_results = 0
+        try:
+            for raw_entity in _iter_search_page(
+                with_schema=with_schema,
+                or_filters=or_filters,
+                start=cursor,
+                count=count,
+            ):
+                n_results += 1
+                yield raw_entity
+        except DataHubError as e:
+            if _is_data_fetching_error(e):
+                return
+            raise e
+
+        if not n_results:
+            return
+        cursor += n_results
+        remaining -= n_results
+
+
+def _iter_search_page(
+    with_schema: frozenset[str], or_filters: list[dict] | None, start: int, count: int
+) -> Iterator[dict]:
+    body = _search_body(
+        with_schema=with_schema, or_filters=or_filters, start=start, count=count
+    )
+    if ijson:
+        yield from datahub_post_stream(
+            body=body, item_prefix="data.search.searchResults.item.entity"
+        )
+    else:
+        search_results = datahub_post(body=body)["data"]["search"]["searchResults"]
+        yield from (x["entity"] for x in search_results)
+
+
+def _minify_query(query: str) -> str:
+    """
+    Collapse all whitespace (indentation, newlines) of a GraphQL query into single
+    spaces, which about halves the size of our (static) queries. Only for queries
+    without whitespace in their string literals.
+    """
+    return " ".join(query.split())
+
+
+# the parts of each (editable and non-editable) schema field that can be queried (see
+# get_datahub_entities' with_schema), fieldPath is always queried. Note that type only
+# exists on non-editable fields.
+_SCHEMA_FIELD_VARS = {
+    "description": "description",
+    "tags": dedent(
         """
-        fieldPath
-        description
         tags {
           tags {
             tag {
@@ -156,6 +729,10 @@ def get_datahub_entities(
             }
           }
         }
+        """
+    ),
+    "glossaryTerms": dedent(
+        """
         glossaryTerms {
           terms {
             term {
@@ -168,139 +745,404 @@ def get_datahub_entities(
             }
           }
         }
+        """
+    ),
+    "type": "type",
+}
+_ALL_SCHEMA_FIELDS = frozenset(_SCHEMA_FIELD_VARS)
+
+_SCHEMA_QUERY = Template(
+    dedent(
+        """
+          schemaMetadata {
+            fields {
+              ...on SchemaField {
+                fieldPath
+                $field_vars
+              }
+            }
+          }
+          editableSchemaMetadata {
+            editableSchemaFieldInfo {
+              ...on EditableSchemaFieldInfo {
+                fieldPath
+                $editable_field_vars
+              }
+            }
+          }
     """
     )
+)
 
-    schema_query = Template(
-        dedent(
-            """
-              schemaMetadata {
-                fields {
-                  ...on SchemaField {
-                    $field_vars
-                    type
-                  }
-                }
-              }
-              editableSchemaMetadata {
-                editableSchemaFieldInfo {
-                  ...on EditableSchemaFieldInfo {
-                    $field_vars
-                  }
+_QUERY_FIELDS_TMPL = Template(
+    dedent(
+        """
+            urn
+            type
+            ...on Dataset {
+              name
+              properties {
+                qualifiedName
+                description
+                customProperties {
+                  ...on CustomPropertiesEntry { key value }
                 }
               }
-        """
-        )
-    ).substitute(field_vars=field_vars)
-
-    query_fields = Template(
-        dedent(
-            """
-                urn
-                type
-                ...on Dataset {
-                  name
-                  properties {
-                    qualifiedName
-                    description
-                    customProperties {
-                      ...on CustomPropertiesEntry { key value }
+                  editableProperties { description }
+                  $schema_query
+                  ownership {
+                    owners {
+                      ownershipType { info { name } }
+                      owner {
+                        ...on CorpUser { urn editableProperties { email }}
+                        ...on CorpGroup { urn editableProperties { email }}
+                      }
                     }
                   }
-                      editableProperties { description }
-                      $schema_query
-                      ownership {
-                        owners {
-                          ownershipType { info { name } }
-                          owner {
-                            ...on CorpUser { urn editableProperties { email }}
-                            ...on CorpGroup { urn editableProperties { email }}
-                          }
-                        }
-                      }
-                      tags {
-                        tags {
-                          tag {
-                            ...on Tag {
-                              urn
-                              properties {
-                                ...on TagProperties { name }
-                              }
-                            }
+                  tags {
+                    tags {
+                      tag {
+                        ...on Tag {
+                          urn
+                          properties {
+                            ...on TagProperties { name }
                           }
                         }
                       }
                     }
+                  }
+                }
 
-            """
-        )
-    ).substitute(schema_query=schema_query if with_schema else "")
-
-    _start = start
-    _chunk_size = chunk_size or 10000
-    _limit = limit or float("inf")
-
-    out: list[DHEntity] = []
-
-    while len(out) < (1 if resource_urns else _limit):
-        if resource_urns:
-            dataset_query = Template('dataset$i: dataset(urn: "$urn"){ $query_fields }')
-
-            query_parts = [
-                dataset_query.substitute(i=i + 1, urn=urn, query_fields=query_fields)
-                for i, urn in enumerate(resource_urns)
-            ]
-
-            query_body = "{" + ",".join(query_parts) + "}"
-
-        else:
-            query_body = Template(
-                """
-                {
-                    search(input: {type: DATASET, query: "*", start: $start, count: $limit}){
-                        start
-                        count
-                        searchResults {
-                            entity { $query_fields }
-                        }
-                    }
+        """
+    )
+)
+_SEARCH_QUERY = Template(
+    dedent(
+        """
+        query getEntities($$start: Int!, $$count: Int!, $$orFilters: [AndFilterInput!]) {
+            search(input: {
+                type: DATASET, query: "*", start: $$start, count: $$count,
+                orFilters: $$orFilters
+            }){
+                start
+                count
+                total
+                searchResults {
+                    entity { $query_fields }
+                }
+            }
+        }
+        """
+    )
+)
+_SCROLL_QUERY = Template(
+    dedent(
+        """
+        query scrollEntities($$scrollId: String, $$count: Int!, $$orFilters: [AndFilterInput!]) {
+            scrollAcrossEntities(input: {
+                types: [DATASET], query: "*", scrollId: $$scrollId, count: $$count,
+                orFilters: $$orFilters
+            }){
+                nextScrollId
+                count
+                total
+                searchResults {
+                    entity { $query_fields }
                 }
-                """
-            ).substitute(start=_start, limit=_chunk_size, query_fields=query_fields)
+            }
+        }
+        """
+    )
+)
+
+
+def _schema_fields(with_schema: bool | Iterable[str]) -> frozenset[str]:
+    """
+    Normalize get_datahub_entities' with_schema into the set of schema field parts to
+    query (empty if the schema is not queried)
+    """
+    if with_schema is True:
+        return _ALL_SCHEMA_FIELDS
+    if not with_schema:
+        return frozenset()
+
+    schema_fields = frozenset(with_schema)
+    unknown = schema_fields - _ALL_SCHEMA_FIELDS
+    if unknown:
+        raise ValueError(
+            f"unknown schema field parts {sorted(unknown)}, expected some of "
+            f"{sorted(_ALL_SCHEMA_FIELDS)}"
+        )
+    return schema_fields
+
+
+# the queries are assembled (once) for each set of schema fields, see _schema_fields;
+# the paging, filters and urns are sent as variables, so a query never changes between
+# requests
+
+
+@functools.lru_cache(maxsize=None)
+def _query_fields(with_schema: frozenset[str]) -> str:
+    """
+    The fields queried for each entity
+    """
+    schema_query = ""
+    if with_schema:
+        # iterate over _SCHEMA_FIELD_VARS, so that the query doesn't depend on the
+        # (arbitrary) order of the set
+        field_vars = [v for k, v in _SCHEMA_FIELD_VARS.items() if k in with_schema]
+        editable_field_vars = [
+            v for k, v in _SCHEMA_FIELD_VARS.items() if k in with_schema and k != "type"
+        ]
+        schema_query = _SCHEMA_QUERY.substitute(
+            field_vars=" ".join(field_vars),
+            editable_field_vars=" ".join(editable_field_vars),
+        )
+    return _minify_query(_QUERY_FIELDS_TMPL.substitute(schema_query=schema_query))
+
+
+@functools.lru_cache(maxsize=None)
+def _search_query(with_schema: frozenset[str]) -> str:
+    query_fields = _query_fields(with_schema)
+    return _minify_query(_SEARCH_QUERY.substitute(query_fields=query_fields))
+
+
+@functools.lru_cache(maxsize=None)
+def _scroll_query(with_schema: frozenset[str]) -> str:
+    query_fields = _query_fields(with_schema)
+    return _minify_query(_SCROLL_QUERY.substitute(query_fields=query_fields))
+
+
+@functools.lru_cache(maxsize=None)
+def _dataset_query_tmpl(with_schema: frozenset[str]) -> Template:
+    return Template(
+        "dataset$i: dataset(urn: $$urn$i){ " + _query_fields(with_schema) + " }"
+    )
+
+
+def _search_body(
+    with_schema: frozenset[str], or_filters: list[dict] | None, start: int, count: int
+) -> dict:
+    return {
+        "query": _search_query(with_schema),
+        "variables": {"start": start, "count": count, "orFilters": or_filters},
+    }
+
 
-        body = {"query": query_body, "variables": {}}
+def _search_page(
+    with_schema: frozenset[str], or_filters: list[dict] | None, start: int, count: int
+) -> dict | None:
+    """
+    Fetch one page of the search endpoint (None if DataHub failed to fetch the data)
+    """
+    body = _search_body(
+        with_schema=with_schema, or_filters=or_filters, start=start, count=count
+    )
+    try:
+        return datahub_post(body=body)["data"]["search"]
+    except DataHubError as e:
+        if _is_data_fetching_error(e):
+            return None
+        raise e
+
+
+def _search_raw_entity_pages(
+    with_schema: frozenset[str],
+    or_filters: list[dict] | None,
+    start: int,
+    limit: int | None,
+    chunk_size: int,
+    max_workers: int = 1,
+) -> Iterator[list[dict]]:
+    """
+    Page through the search endpoint, starting at `start`, until `limit` entities (or
+    all of them, if no limit) have been retrieved, yielding the raw entities of each
+    page. With max_workers > 1, the first page tells us how many entities there are in
+    total and the remaining pages are then fetched concurrently.
+    """
+    cursor = start
+    remaining = limit or float("inf")
 
+    while remaining > 0:
+        count = int(min(remaining, chunk_size))
+        page = _search_page(
+            with_schema=with_schema, or_filters=or_filters, start=cursor, count=count
+        )
+        search_results = page["searchResults"] if page else None
+        if not search_results:
+            return
+        # important: you can get more than one URN per qualified name because there
+        # may be more than one platform (e.g. dbt, snowflake, etc.).
+        yield [x["entity"] for x in search_results]
+        cursor += len(search_results)
+        remaining -= len(search_results)
+
+        if max_workers > 1 and page.get("total") is not None:
+            yield from _search_pages_concurrently(
+                with_schema=with_schema,
+                or_filters=or_filters,
+                start=cursor,
+                stop=int(min(page["total"], cursor + remaining)),
+                chunk_size=chunk_size,
+                max_workers=max_workers,
+            )
+            return
+
+
+def _scroll_raw_entity_pages(
+    with_schema: frozenset[str],
+    or_filters: list[dict] | None,
+    start: int,
+    limit: int | None,
+    chunk_size: int,
+) -> Iterator[list[dict]]:
+    """
+    Like _search_raw_entity_pages, with the scrollAcrossEntities endpoint: each page
+    carries the scroll id of the next one, so DataHub never has to skip over the results
+    of the previous pages.
+    """
+    if start:
+        raise ValueError("start is not supported when scrolling")
+
+    scroll_id = None
+    remaining = limit or float("inf")
+    while remaining > 0:
+        body = {
+            "query": _scroll_query(with_schema),
+            "variables": {
+                "scrollId": scroll_id,
+                "count": int(min(remaining, chunk_size)),
+                "orFilters": or_filters,
+            },
+        }
         try:
-            query_result = datahub_post(body=body)["data"]
-            if resource_urns:
-                dh_entities = [{"entity": v} for k, v in query_result.items()]
-            else:
-                dh_entities = query_result["search"]["searchResults"]
+            page = datahub_post(body=body)["data"]["scrollAcrossEntities"]
         except DataHubError as e:
-            if e.args:
-                error_classification = jmespath.search(
-                    "errors[0].extensions.classification", e.args[0]
-                )
-                if error_classification == "DataFetchingException":
-                    break
-                else:
-                    raise e
-            else:
-                raise e
-        else:
-            if not dh_entities:
-                break
-            _start += _chunk_size
-            # important: you can get more than one URN per qualified name because there
-            # may be more than one platform (e.g. dbt, snowflake, etc.).
-            for dh_entity in dh_entities:
-                out.append(DHEntity.from_dict(_dict=dh_entity["entity"]))
+            if _is_data_fetching_error(e):
+                return
+            raise e
+
+        search_results = page["searchResults"]
+        if not search_results:
+            return
+        yield [x["entity"] for x in search_results]
+        remaining -= len(search_results)
+        scroll_id = page.get("nextScrollId")
+        if not scroll_id:
+            return
+
+
+def _search_pages_concurrently(
+    with_schema: frozenset[str],
+    or_filters: list[dict] | None,
+    start: int,
+    stop: int,
+    chunk_size: int,
+    max_workers: int,
+) -> Iterator[list[dict]]:
+    def _fetch(offset: int) -> dict | None:
+        return _search_page(
+            with_schema=with_schema,
+            or_filters=or_filters,
+            start=offset,
+            count=min(chunk_size, stop - offset),
+        )
 
-    return out
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        # pages are returned in order; like the sequential paging, stop at the first
+        # page that failed or came back empty
+        for page in executor.map(_fetch, range(start, stop, chunk_size)):
+            if not page or not page["searchResults"]:
+                return
+            yield [x["entity"] for x in page["searchResults"]]
+
+
+def _get_raw_entities_by_urn(
+    resource_urns: list[str],
+    with_schema: frozenset[str],
+    chunk_size: int,
+    max_workers: int = 1,
+) -> list[dict]:
+    """
+    Fetch the datasets of the given urns, chunk_size urns per request. With
+    max_workers > 1, the requests are sent concurrently.
+    """
+    chunks = [
+        resource_urns[i : i + chunk_size]
+        for i in range(0, len(resource_urns), chunk_size)
+    ]
+    fetch = functools.partial(_get_raw_entity_chunk, with_schema=with_schema)
+    if max_workers > 1 and len(chunks) > 1:
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            results = list(executor.map(fetch, chunks))
+    else:
+        results = [fetch(x) for x in chunks]
+    return [x for result in results for x in result]
+
+
+def _get_raw_entity_chunk(
+    resource_urns: list[str], with_schema: frozenset[str]
+) -> list[dict]:
+    # the urns are sent as variables ($urn1, $urn2, ...), so that the query only depends
+    # on the number of urns
+    dataset_query = _dataset_query_tmpl(with_schema)
+    indices = range(1, len(resource_urns) + 1)
+    params = ", ".join(f"$urn{i}: String!" for i in indices)
+    query_parts = ",".join(dataset_query.substitute(i=i) for i in indices)
+    body = {
+        "query": f"query getDatasets({params}) {{{query_parts}}}",
+        "variables": {f"urn{i}": urn for i, urn in zip(indices, resource_urns)},
+    }
+
+    try:
+        query_result = datahub_post(body=body)["data"]
+    except DataHubError as e:
+        if _is_data_fetching_error(e):
+            return []
+        raise e
+
+    return list(query_result.values())
+
+
+def _parse_entities(
+    raw_entities: list[dict], parse_workers: int | None = None
+) -> list[DHEntity]:
+    if not parse_workers or len(raw_entities) < 2:
+        return [DHEntity.from_dict(_dict=x) for x in raw_entities]
+
+    # DHEntity.from_dict is stateless and DHEntity can be pickled, so the parsing can
+    # be spread across processes
+    chunksize = max(1, min(256, len(raw_entities) // parse_workers))
+    with ProcessPoolExecutor(max_workers=parse_workers) as executor:
+        return list(executor.map(DHEntity.from_dict, raw_entities, chunksize=chunksize))
+
+
+def _is_data_fetching_error(error: DataHubError) -> bool:
+    return bool(error.args) and (
+        jmespath.search("errors[0].extensions.classification", error.args[0])
+        == "DataFetchingException"
+    )
+
+
+def _build_or_filters(**filters: Iterable[str] | None) -> list[dict] | None:
+    """
+    Assemble the `orFilters` input of the search endpoint, matching entities where each
+    field (keyword) has one of the given values. Fields whose values are None are not
+    filtered on.
+    """
+    and_filters = [
+        {"field": field, "values": sorted(set(values))}
+        for field, values in filters.items()
+        if values is not None
+    ]
+    return [{"and": and_filters}] if and_filters else None
 
 
 def get_owners(
-    resource_urn: str, user_fields: str = "urn type", group_fields: str = "urn type"
+    resource_urn: str,
+    user_fields: str = "urn type",
+    group_fields: str = "urn type",
+    cache_ttl: float | None = None,
 ) -> list[dict[str, str]]:
     """
     Find a list of owners for a given resource_urn. Example format of one entry in the
@@ -312,227 +1154,326 @@ def get_owners(
     :param group_fields: The fields you want to extract from the CorpUser object.
       Defaults to 'urn type'. See
       https://datahubproject.io/docs/graphql/objects#corpgroup
+    :param cache_ttl: If provided, the response is cached in memory for this many
+      seconds (see clear_response_cache). Note that the cached dictionaries are shared
+      between calls.
     :return: A list of dictionaries, each a type of owner for the given resource
     """
-    body = {
-        "query": (
-            Template(
-                """
-                {
-                    dataset(urn: "$resource_urn") {
-                        ownership {
-                            owners {
-                                owner {
-                                    ... on CorpUser { $user_fields }
-                                    ... on CorpGroup { $group_fields }
-                                }
-                            }
-                        }
-                    }
-                }
-            """
-            )
-        ).substitute(
-            resource_urn=resource_urn,
-            user_fields=user_fields,
-            group_fields=group_fields,
-        ),
-        "variables": {},
-    }
-    response = datahub_post(body=body) or {}
-    raw_owners = jmespath.search("data.dataset.ownership.owners", response) or []
-    return [x["owner"] for x in raw_owners]
+    return get_owners_bulk(
+        resource_urns=[resource_urn],
+        user_fields=user_fields,
+        group_fields=group_fields,
+        cache_ttl=cache_ttl,
+    )[resource_urn]
+
+
+def get_owners_bulk(
+    resource_urns: Iterable[str],
+    user_fields: str = "urn type",
+    group_fields: str = "urn type",
+    cache_ttl: float | None = None,
+) -> dict[str, list[dict[str, str]]]:
+    """
+    Like get_owners, for many resources at once: the resources are queried
+    _MAX_QUERIES_PER_REQUEST at a time (as aliases of a single query) instead of with
+    one request each.
+    :param resource_urns: The resources you want to fetch
+    :param user_fields: see get_owners
+    :param group_fields: see get_owners
+    :param cache_ttl: see get_owners
+    :return: resource urn -> its owners (see get_owners)
+    """
+    resource_urns = list(resource_urns)
+    selection = (
+        "ownership { owners { owner { "
+        f"... on CorpUser {{ {user_fields} }} ... on CorpGroup {{ {group_fields} }}"
+        " } } }"
+    )
+    out = {}
+    for chunk_start in range(0, len(resource_urns), _MAX_QUERIES_PER_REQUEST):
+        chunk = resource_urns[chunk_start : chunk_start + _MAX_QUERIES_PER_REQUEST]
+        params = ", ".join(f"$r{i}: String!" for i in range(len(chunk)))
+        aliased = " ".join(
+            f"r{i}: dataset(urn: $r{i}) {{ {selection} }}" for i in range(len(chunk))
+        )
+        body = {
+            "query": f"query getOwners({params}) {{ {aliased} }}",
+            "variables": {f"r{i}": urn for i, urn in enumerate(chunk)},
+        }
+        response = _cached_post(body=body, ttl=cache_ttl) or {}
+        for i, urn in enumerate(chunk):
+            raw_owners = jmespath.search(f"data.r{i}.ownership.owners", response) or []
+            out[urn] = [x["owner"] for x in raw_owners]
+    return out
 
 
-def get_glossary_terms() -> list[dict]:
-    body = {
-        "query": dedent(
-            """
-            {
-              search(input: {type: GLOSSARY_TERM, query: "*", start:0, count: 1000}) {
-                searchResults {
-                  entity {
-                    urn
-                    ... on GlossaryTerm{
-                      deprecation { deprecated }
-                      properties { name }
-                      parentNodes {
-                        nodes { urn properties { name } }
-                      }
-                    }
-                  }
-                }
+_GLOSSARY_TERMS_QUERY = _minify_query(
+    """
+    {
+      search(input: {type: GLOSSARY_TERM, query: "*", start:0, count: 1000}) {
+        searchResults {
+          entity {
+            urn
+            ... on GlossaryTerm{
+              deprecation { deprecated }
+              properties { name }
+              parentNodes {
+                nodes { urn properties { name } }
               }
             }
-            """
-        ),
-        "variables": {},
+          }
+        }
+      }
     }
-    search_results = datahub_post(body=body)["data"]["search"]["searchResults"]
-    glossary_terms = []
-    for entity in search_results:
-        glossary_term = entity["entity"]
-
-        parents = []
-        for parent in glossary_term["parentNodes"]["nodes"]:
-            parents.append(
-                {
-                    "urn": parent["urn"],
-                    "name": parent["properties"]["name"],
-                }
-            )
-
-        glossary_terms.append(
-            {
-                "urn": glossary_term["urn"],
-                "is_deprecated": bool(glossary_term["deprecation"]),
-                "name": glossary_term["properties"]["name"],
-                "parents": parents,
-            }
-        )
-    return glossary_terms
+    """
+)
 
 
-def get_datahub_users() -> list[dict[str, str]]:
+def get_glossary_terms(cache_ttl: float | None = None) -> list[dict]:
     """
-    :return: list of datahub users and their metadata (including urn)
+    :param cache_ttl: If provided, the response is cached in memory for this many
+      seconds (see clear_response_cache)
     """
-    qry = """
-    {
-        listUsers(input: { query: "*", start: 0, count: 10000 }) {
-            users {
-                urn
-                type
-                username
-                properties {
-                    active
-                    displayName
-                    email
-                    title
-                    fullName
-                    departmentName
-                }
-                editableProperties {
-                    displayName
-                    title
-                    teams
-                    slack
-                    email
-                }
-                status
-                isNativeUser
-            }
+    body = {"query": _GLOSSARY_TERMS_QUERY, "variables": {}}
+    response = _cached_post(body=body, ttl=cache_ttl)
+    search_results = response["data"]["search"]["searchResults"]
+    return [
+        {
+            "urn": glossary_term["urn"],
+            "is_deprecated": bool(glossary_term["deprecation"]),
+            "name": glossary_term["properties"]["name"],
+            "parents": [
+                {"urn": parent["urn"], "name": parent["properties"]["name"]}
+                for parent in glossary_term["parentNodes"]["nodes"]
+            ],
         }
+        for glossary_term in (x["entity"] for x in search_results)
+    ]
+
+
+_USER_FIELDS = """
+    urn
+    type
+    username
+    properties {
+        active
+        displayName
+        email
+        title
+        fullName
+        departmentName
     }
-    """
-
-    body = {
-        "query": qry,
-        "variables": {},
+    editableProperties {
+        displayName
+        title
+        teams
+        slack
+        email
     }
-    users = []
-    for user in datahub_post(body=body)["data"]["listUsers"]["users"]:
-        # editable_props = user.pop("editableProperties")
-        # if editable_props:
-        #     user.update(editable_props)
-        users.append(user)
-    return users
-
+    status
+    isNativeUser
+"""
+
+_GROUP_FIELDS = """
+    urn
+    type
+    name
+    properties {
+        displayName
+        description
+        email
+        slack
+    }
+    editableProperties {
+        description
+        slack
+        email
+    }
+"""
 
-def get_datahub_groups() -> list[dict[str, str]]:
-    """
-    :return: list of datahub groups and their metadata (including urn)
+_LIST_QUERY = Template(
     """
-    qry = """
-    {
-        listGroups(input: { query: "*", start: 0, count: 10000 }) {
-            groups {
-                urn
-                type
-                name
-                properties {
-                    displayName
-                    description
-                    email
-                    slack
-                }
-                editableProperties {
-                    description
-                    slack
-                    email
-                }
-            }
+    query $endpoint($$start: Int!, $$count: Int!) {
+        $endpoint(input: { query: "*", start: $$start, count: $$count }) {
+            total
+            $result_key { $fields }
         }
     }
     """
+)
 
-    body = {
-        "query": qry,
-        "variables": {},
-    }
-    users = []
-    for user in datahub_post(body=body)["data"]["listGroups"]["groups"]:
-        # editable_props = user.pop("editableProperties")
-        # if editable_props:
-        #     user.update(editable_props)
-        users.append(user)
-    return users
+
+def get_datahub_users(
+    fields: str = _USER_FIELDS,
+    page_size: int = _MAX_SEARCH_COUNT,
+    max_workers: int = 1,
+    cache_ttl: float | None = None,
+) -> list[dict[str, str]]:
+    """
+    :param fields: The fields you want to extract from the CorpUser object, e.g. "urn
+      username" (defaults to all the user's properties)
+    :param page_size: The number of users retrieved per request
+    :param max_workers: If greater than 1, the pages after the first one are fetched
+      concurrently by this many threads
+    :param cache_ttl: If provided, the responses are cached in memory for this many
+      seconds (see clear_response_cache). Note that the cached dictionaries are shared
+      between calls.
+    :return: list of datahub users and their metadata (including urn)
+    """
+    return _list_all(
+        endpoint="listUsers",
+        result_key="users",
+        fields=fields,
+        page_size=page_size,
+        max_workers=max_workers,
+        cache_ttl=cache_ttl,
+    )
 
 
-def _replace_match(match: re.Match) -> str:
+def get_datahub_groups(
+    fields: str = _GROUP_FIELDS,
+    page_size: int = _MAX_SEARCH_COUNT,
+    max_workers: int = 1,
+    cache_ttl: float | None = None,
+) -> list[dict[str, str]]:
     """
-    Replace an escaped character match to be compatible with the query template
+    :param fields: The fields you want to extract from the CorpGroup object, e.g. "urn
+      name" (defaults to all the group's properties)
+    :param page_size: The number of groups retrieved per request
+    :param max_workers: If greater than 1, the pages after the first one are fetched
+      concurrently by this many threads
+    :param cache_ttl: If provided, the responses are cached in memory for this many
+      seconds (see clear_response_cache). Note that the cached dictionaries are shared
+      between calls.
+    :return: list of datahub groups and their metadata (including urn)
     """
-    _replace_map = {
-        '"': '\\"',
-        "\n": "\\n",
-        "\t": "\\t",
-    }
-    return _replace_map.get(match.group(0))
+    return _list_all(
+        endpoint="listGroups",
+        result_key="groups",
+        fields=fields,
+        page_size=page_size,
+        max_workers=max_workers,
+        cache_ttl=cache_ttl,
+    )
 
 
-def _escape_chars(_str: str) -> str:
+def _list_all(
+    endpoint: str,
+    result_key: str,
+    fields: str,
+    page_size: int,
+    max_workers: int = 1,
+    cache_ttl: float | None = None,
+) -> list[dict]:
     """
-    Convenience method to handle escaped characters within a string
-    For GraphQL queries this cannot be used within an f-string otherwise it will incorrectly escape the quotes
-        e.g. f'"{_escape_chars('\"foo\"}"' will output '\\\"foo\\\"' instead of the desired '\\"foo\\"'
-        instead use '"' + _escape_chars('\"foo\") + '"'
+    Page through one of the list endpoints (e.g. listUsers) until every result has
+    been retrieved. With max_workers > 1, the first page tells us how many results
+    there are in total and the remaining pages are then fetched concurrently.
     """
-    # first escape backslashes separately to prevent other characters from being double escaped
-    _backslash_str = re.sub(r"\\(?!n|t)", r"\\\\", _str)
+    query = _LIST_QUERY.substitute(
+        endpoint=endpoint, result_key=result_key, fields=fields
+    )
+
+    def _fetch(start: int) -> dict:
+        body = {"query": query, "variables": {"start": start, "count": page_size}}
+        return _cached_post(body=body, ttl=cache_ttl)["data"][endpoint]
+
+    data = _fetch(0)
+    out = list(data[result_key])
+    if max_workers > 1 and out:
+        # step by the size of the first page, in case DataHub returns fewer results
+        # per page than page_size
+        starts = range(len(out), data["total"], len(out))
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            for page in executor.map(_fetch, starts):
+                if not page[result_key]:
+                    break
+                out.extend(page[result_key])
+        return out
 
-    pattern = r'(["\n\t])'
-    return re.sub(pattern, _replace_match, _backslash_str)
+    while out and len(out) < data["total"]:
+        data = _fetch(len(out))
+        if not data[result_key]:
+            break
+        out.extend(data[result_key])
+    return out
 
 
 def update_field_descriptions(
-    resource_urn: str, field_descriptions: dict[str, str]
+    resource_urn: str, field_descriptions: dict[str, str], max_workers: int = 1
 ) -> dict[str, str]:
     """
     Update the editable schema field description for one or more fields within a dataset
     :param resource_urn: The URN for the related dataset/resource
     :param field_descriptions: A dictionary where the key-value pairs are the flattened fieldPath (name)
       for the column and the description.
+    :param max_workers: see update_descriptions
     :return: Resource URN changed
     """
-    responses = {}
-    for k, v in field_descriptions.items():
-        _input = (
-            '{ description: "' + _escape_chars(v) + '", '
-            f'resourceUrn: "{resource_urn}", '
-            f"subResourceType: DATASET_FIELD, "
-            f'subResource: "{k}" }}'
-        )
-        endpoint = "updateDescription"
-        response = _post_mutation(
-            endpoint=endpoint,
-            _input=_input,
+    responses = update_descriptions(
+        descriptions=[(resource_urn, v, k) for k, v in field_descriptions.items()],
+        max_workers=max_workers,
+    )
+    return dict(zip(field_descriptions, responses))
+
+
+def update_field_descriptions_bulk(
+    updates: dict[str, dict[str, str]], max_workers: int = 1
+) -> dict[str, dict[str, bool]]:
+    """
+    Like update_field_descriptions, for the fields of many datasets at once (all their
+    updates are batched together, see update_descriptions)
+    :param updates: resource urn -> field descriptions (see update_field_descriptions)
+    :param max_workers: see update_descriptions
+    :return: resource urn -> field -> the response of its update
+    """
+    descriptions = [
+        (urn, description, field)
+        for urn, field_descriptions in updates.items()
+        for field, description in field_descriptions.items()
+    ]
+    responses = iter(update_descriptions(descriptions, max_workers=max_workers))
+    # the responses are in the order of the descriptions, i.e. of updates
+    return {
+        urn: {field: next(responses) for field in field_descriptions}
+        for urn, field_descriptions in updates.items()
+    }
+
+
+def update_descriptions(
+    descriptions: Iterable[tuple[str, str, str | None]], max_workers: int = 1
+) -> list[bool]:
+    """
+    Update many descriptions, packing up to _MAX_MUTATIONS_PER_REQUEST of them in each
+    request to DataHub.
+    :param descriptions: (resource_urn, description, field) triplets, where field is
+      the flattened fieldPath (name) of the column to describe, or None to describe the
+      dataset/resource itself.
+    :param max_workers: If greater than 1, the requests are sent concurrently by this
+      many threads (only when there are more than _MAX_MUTATIONS_PER_REQUEST
+      descriptions). The order in which the descriptions are applied is then undefined,
+      so don't describe the same resource/field twice.
+    :return: the response of each update, in the order given
+    """
+    descriptions = list(descriptions)
+    mutations = []
+    for resource_urn, description, field_path in descriptions:
+        _input = {"description": description, "resourceUrn": resource_urn}
+        if field_path is not None:
+            _input["subResourceType"] = "DATASET_FIELD"
+            _input["subResource"] = field_path
+        mutations.append(("updateDescription", _input))
+    if not mutations:
+        return []
+
+    response = _post_mutations(mutations=mutations, max_workers=max_workers) or {}
+    responses = [response.get(f"m{i}") for i in range(len(mutations))]
+    failed = [x for x, ok in zip(descriptions, responses) if not ok]
+    if failed:
+        raise ValueError(
+            "Failed to update descriptions (but returned 200) for "
+            + ", ".join(f"{urn} ({field_path})" for urn, _, field_path in failed)
         )
-        if not response:
-            raise ValueError(
-                f"Failed to update field description '{k}' (but returned 200) for {resource_urn}"
-            )
-        responses[k] = response[endpoint]
     return responses
 
 
@@ -543,9 +1484,7 @@ def update_dataset_description(resource_urn: str, description: str) -> dict[str,
     :param description: The description that you want to set for the dataset/resource
     :return: Resource URN changed
     """
-    _input = (
-        '{ editableProperties: { description: "' + _escape_chars(description) + '" } }'
-    )
+    _input = {"editableProperties": {"description": description}}
     endpoint = "updateDataset"
     response = _post_mutation(
         endpoint=endpoint, _input=_input, urn=resource_urn, subselection="urn"
@@ -569,12 +1508,13 @@ def update_institutional_memory(
     :param created_at: The time at which this metadata was created
     :return:
     """
-    element = (
-        f'{{ url: "{url}", '
-        'description: "' + _escape_chars(description) + '", '
-        f'author: "{author_urn}", createdAt: {created_at} }}'
-    )
-    _input = f"{{ institutionalMemory: {{ elements: [{element}] }} }}"
+    element = {
+        "url": url,
+        "description": description,
+        "author": author_urn,
+        "createdAt": created_at,
+    }
+    _input = {"institutionalMemory": {"elements": [element]}}
     endpoint = "updateDataset"
     response = _post_mutation(
         endpoint=endpoint, _input=_input, urn=resource_urn, subselection="urn"
@@ -587,88 +1527,260 @@ def update_institutional_memory(
 
 
 def set_group_owner(
-    group_urn: str, resource_urns: list[str], owner_type: str = TECHNICAL_OWNER
+    group_urn: str,
+    resource_urns: list[str],
+    owner_type: str = TECHNICAL_OWNER,
+    max_workers: int = 1,
 ):
-    owner = f'{{ ownerUrn: "{group_urn}", ownerEntityType: CORP_GROUP, ownershipTypeUrn: "{owner_type}" }}'
-    _set_owner(urns=resource_urns, owner=owner)
+    _set_owner(
+        owner_urn=group_urn,
+        owner_entity_type="CORP_GROUP",
+        owner_type=owner_type,
+        urns=resource_urns,
+        max_workers=max_workers,
+    )
 
 
 def set_user_owner(
-    user_urn: str, resource_urns: list[str], owner_type: str = BUSINESS_OWNER
+    user_urn: str,
+    resource_urns: list[str],
+    owner_type: str = BUSINESS_OWNER,
+    max_workers: int = 1,
 ):
-    owner = f'{{ ownerUrn: "{user_urn}", ownerEntityType: CORP_USER, ownershipTypeUrn: "{owner_type}" }}'
-    _set_owner(urns=resource_urns, owner=owner)
+    _set_owner(
+        owner_urn=user_urn,
+        owner_entity_type="CORP_USER",
+        owner_type=owner_type,
+        urns=resource_urns,
+        max_workers=max_workers,
+    )
 
 
-def _set_owner(owner: str, urns: list[str]):
-    resource_urns = ", ".join([f'{{ resourceUrn: "{urn}" }}' for urn in urns])
-    _input = f"{{ owners: [ {owner} ], resources: [ {resource_urns} ] }}"
-    response = _post_mutation(endpoint="batchAddOwners", _input=_input)
-    if not response:
-        raise ValueError(f"Setting table owners for {owner} failed! (but returned 200)")
+def _set_owner(
+    owner_urn: str,
+    owner_entity_type: str,
+    owner_type: str,
+    urns: list[str],
+    max_workers: int = 1,
+):
+    owners = [
+        {
+            "ownerUrn": owner_urn,
+            "ownerEntityType": owner_entity_type,
+            "ownershipTypeUrn": owner_type,
+        }
+    ]
+    mutations = [
+        ("batchAddOwners", x) for x in _with_resources({"owners": owners}, urns)
+    ]
+    response = _post_mutations(mutations=mutations, max_workers=max_workers)
+    if not response or not all(response.values()):
+        raise ValueError(
+            f"Setting table owners for {owner_urn} failed! (but returned 200)"
+        )
 
 
-def remove_owners(owners: Iterable[str], urns: list[str]):
+def remove_owners(owners: Iterable[str], urns: list[str], max_workers: int = 1):
     if isinstance(owners, str):
         owners = [owners]
-    owner_urns = ", ".join(f'"{owner}"' for owner in owners)
-    resource_urns = ", ".join([f'{{ resourceUrn: "{urn}" }}' for urn in urns])
-    _input = f"{{ ownerUrns: [ {owner_urns} ], resources: [ {resource_urns} ] }}"
-    response = _post_mutation(endpoint="batchRemoveOwners", _input=_input)
-    if not response:
+    mutations = [
+        ("batchRemoveOwners", x)
+        for x in _with_resources({"ownerUrns": list(owners)}, urns)
+    ]
+    response = _post_mutations(mutations=mutations, max_workers=max_workers)
+    if not response or not all(response.values()):
         raise ValueError(
             f"Removing table owners ({owners}) for {urns} failed! (but returned 200)"
         )
 
 
 def assign_role_to_users(role_urn: str, urns: list[str]):
-    _role_urn = f'"{role_urn}"'
-    user_urns = ", ".join(f'"{user}"' for user in urns)
-    _input = f"{{ roleUrn: {_role_urn}, actors: [ {user_urns} ] }}"
-    response = _post_mutation(endpoint="batchAssignRole", _input=_input)
-    if not response:
+    _input = {"roleUrn": role_urn, "actors": list(urns)}
+    response = _post_mutations(mutations=[("batchAssignRole", _input)])
+    if not response or not response["m0"]:
         raise ValueError(
-            f"Setting role {role_urn} to users {user_urns} failed! (but returned 200)"
+            f"Setting role {role_urn} to users {urns} failed! (but returned 200)"
         )
 
 
-def set_tags(tag_urns: Iterable[str], resource_urns: Iterable[str]):
+def set_tags(
+    tag_urns: Iterable[str], resource_urns: Iterable[str], max_workers: int = 1
+):
     _change_tags(
-        endpoint="batchAddTags", tag_urns=tag_urns, resource_urns=resource_urns
+        endpoint="batchAddTags",
+        tag_urns=tag_urns,
+        resource_urns=resource_urns,
+        max_workers=max_workers,
     )
 
 
-def remove_tags(tag_urns: Iterable[str], resource_urns: Iterable[str]):
+def remove_tags(
+    tag_urns: Iterable[str], resource_urns: Iterable[str], max_workers: int = 1
+):
     _change_tags(
-        endpoint="batchRemoveTags", tag_urns=tag_urns, resource_urns=resource_urns
+        endpoint="batchRemoveTags",
+        tag_urns=tag_urns,
+        resource_urns=resource_urns,
+        max_workers=max_workers,
+    )
+
+
+def update_tags(
+    tags_to_add: dict[str, Iterable[str]] | None = None,
+    tags_to_remove: dict[str, Iterable[str]] | None = None,
+):
+    """
+    Add and remove many tags with a few requests: the changes are batched as aliased
+    mutations (_MAX_MUTATIONS_PER_REQUEST per request, and _MAX_RESOURCES_PER_MUTATION
+    resources per mutation), sent one request after the other. All removals are sent
+    before the adds.
+    :param tags_to_add: tag urn -> the resource urns that the tag should be added to
+    :param tags_to_remove: tag urn -> the resource urns that the tag should be removed
+      from
+    """
+    mutations = [
+        ("batchRemoveTags", x)
+        for k, v in (tags_to_remove or {}).items()
+        for x in _tags_inputs(tag_urns=k, resource_urns=v)
+    ]
+    mutations.extend(
+        ("batchAddTags", x)
+        for k, v in (tags_to_add or {}).items()
+        for x in _tags_inputs(tag_urns=k, resource_urns=v)
     )
+    if not mutations:
+        return
+
+    response = _post_mutations(mutations=mutations)
+    if not response or not all(response.values()):
+        raise ValueError(
+            f"Updating tags failed! (but returned 200). Adds: {tags_to_add}, "
+            f"removals: {tags_to_remove}"
+        )
 
 
-def _change_tags(endpoint: str, tag_urns: Iterable[str], resource_urns: Iterable[str]):
+def _tags_inputs(tag_urns: Iterable[str], resource_urns: Iterable[str]) -> list[dict]:
     if isinstance(tag_urns, str):
         tag_urns = [tag_urns]
-    _tags = ", ".join(f'"{t}"' for t in tag_urns)
+    return _with_resources({"tagUrns": list(tag_urns)}, resource_urns)
+
 
+def _with_resources(_input: dict, resource_urns: Iterable[str]) -> list[dict]:
+    """
+    Copies of the input of a batch* mutation, one per batch of (at most
+    _MAX_RESOURCES_PER_MUTATION) resources
+    """
+    resources = _resources_input(resource_urns)
+    return [
+        {**_input, "resources": resources[i : i + _MAX_RESOURCES_PER_MUTATION]}
+        for i in range(0, max(len(resources), 1), _MAX_RESOURCES_PER_MUTATION)
+    ]
+
+
+def _resources_input(resource_urns: Iterable[str]) -> list[dict[str, str]]:
     if isinstance(resource_urns, str):
         resource_urns = [resource_urns]
-    _res = ", ".join([f'{{ resourceUrn: "{urn}" }}' for urn in resource_urns])
-    _input = f"{{ tagUrns: [ {_tags} ], resources: [ {_res} ] }}"
+    return [{"resourceUrn": urn} for urn in resource_urns]
 
-    response = _post_mutation(endpoint=endpoint, _input=_input)
-    if not response:
+
+def _change_tags(
+    endpoint: str,
+    tag_urns: Iterable[str],
+    resource_urns: Iterable[str],
+    max_workers: int = 1,
+):
+    if isinstance(resource_urns, str):
+        resource_urns = [resource_urns]
+    else:
+        # may be a generator, and is needed again for the error message
+        resource_urns = list(resource_urns)
+    mutations = [
+        (endpoint, x)
+        for x in _tags_inputs(tag_urns=tag_urns, resource_urns=resource_urns)
+    ]
+    response = _post_mutations(mutations=mutations, max_workers=max_workers)
+    if not response or not all(response.values()):
         raise ValueError(
             f"{endpoint} {tag_urns} for {resource_urns} failed! (but returned 200)"
         )
 
 
 def _post_mutation(
-    endpoint: str, _input: str, urn: str | None = None, subselection: str | None = None
+    endpoint: str, _input: dict, urn: str | None = None, subselection: str | None = None
 ) -> dict | None:
-    _urn = f'urn: "{urn}", ' if urn else ""
+    """
+    Send a single mutation, the input (and urn) are sent as GraphQL variables.
+    :param endpoint: The mutation endpoint, must be one of _MUTATION_INPUT_TYPES
+    """
+    params = f"$input: {_MUTATION_INPUT_TYPES[endpoint]}!"
+    args = "input: $input"
+    variables = {"input": _input}
+    if urn:
+        params = f"$urn: String!, {params}"
+        args = f"urn: $urn, {args}"
+        variables["urn"] = urn
     _subselection = f" {{ {subselection} }}" if subselection else ""
     body = {
-        "query": f"mutation {endpoint} {{ {endpoint}({_urn}input: {_input}){_subselection} }}",
-        "variables": {},
+        "query": f"mutation {endpoint}({params}) {{ {endpoint}({args}){_subselection} }}",
+        "variables": variables,
     }
-    response = datahub_post(body=body)
+    try:
+        response = datahub_post(body=body)
+    finally:
+        # the mutation may have changed what the cached queries return
+        _clear_cache(_RESPONSE_CACHE)
     return response["data"] if response else None
+
+
+def _post_mutations(
+    mutations: list[tuple[str, dict]], max_workers: int = 1
+) -> dict | None:
+    """
+    Send several mutations, each aliased as m0, m1, ..., packing up to
+    _MAX_MUTATIONS_PER_REQUEST of them in each request (to stay under DataHub's query
+    complexity limits). Inputs are sent as GraphQL variables (one per alias), so they
+    never need escaping.
+    :param mutations: (endpoint, input) pairs, the endpoint must be one of
+      _MUTATION_INPUT_TYPES
+    :param max_workers: By default, the requests are sent one after the other and the
+      mutations are executed by DataHub in the order given. If greater than 1, the
+      requests are sent concurrently by this many threads (only use this if the
+      mutations are independent of each other).
+    :return: the response data, keyed by alias
+    """
+    bodies = [
+        _mutations_body(
+            mutations=mutations[chunk_start : chunk_start + _MAX_MUTATIONS_PER_REQUEST],
+            start=chunk_start,
+        )
+        for chunk_start in range(0, len(mutations), _MAX_MUTATIONS_PER_REQUEST)
+    ]
+    if max_workers > 1 and len(bodies) > 1:
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            responses = list(executor.map(datahub_post, bodies))
+    else:
+        # lazy, so that no more requests are sent once one failed
+        responses = map(datahub_post, bodies)
+
+    out = {}
+    try:
+        for response in responses:
+            if not response:
+                return None
+            out.update(response["data"])
+    finally:
+        # the mutations may have changed what the cached queries return
+        _clear_cache(_RESPONSE_CACHE)
+    return out
+
+
+def _mutations_body(mutations: list[tuple[str, dict]], start: int) -> dict:
+    chunk = list(enumerate(mutations, start=start))
+    params = ", ".join(
+        f"$m{i}: {_MUTATION_INPUT_TYPES[endpoint]}!" for i, (endpoint, _) in chunk
+    )
+    aliased = " ".join(f"m{i}: {endpoint}(input: $m{i})" for i, (endpoint, _) in chunk)
+    return {
+        "query": f"mutation batchMutations({params}) {{ {aliased} }}",
+        "variables": {f"m{i}": _input for i, (_, _input) in chunk},
+    }
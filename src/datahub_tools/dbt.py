@@ -1,7 +1,11 @@
 from __future__ import annotations
 
-import json
-from collections.abc import Iterable
+import functools
+import hashlib
+import logging
+import os
+import pickle
+from collections.abc import Iterable, Iterator
 from dataclasses import dataclass
 from functools import reduce
 from operator import iconcat
@@ -10,6 +14,23 @@ from typing import Any
 
 import jmespath
 
+from . import _json
+
+try:
+    import ijson
+except ImportError:
+    ijson = None
+
+logger = logging.getLogger(__name__)
+
+# a suggested location for the on-disk manifest cache (see extract_dbt_resources)
+DEFAULT_CACHE_DIR = Path.home() / ".cache" / "datahub_tools"
+# bump whenever the format of the cached manifest nodes changes
+_CACHE_VERSION = 2
+# key under which extract_dbt_resources stores each resource's name (see
+# get_resource_name)
+RESOURCE_NAME_KEY = "__resource_name"
+
 
 @dataclass
 class Dependency:
@@ -68,22 +89,50 @@ def reverse_dependencies(dependencies: dict[str, set[str]]) -> dict[str, set[str
     return out
 
 
+def get_resource_name(resource: dict[str, Any]) -> str:
+    """
+    The storage name of a dbt resource, which is also how DataHub names it (e.g.
+    prep.core.calendar). Resources from extract_dbt_resources already carry their name
+    under RESOURCE_NAME_KEY.
+    """
+    if RESOURCE_NAME_KEY in resource:
+        return resource[RESOURCE_NAME_KEY]
+    table_name = resource.get("alias") or resource["name"]
+    return f"{resource['database']}.{resource['schema']}.{table_name}"
+
+
 def extract_dbt_resources(
-    manifest_file: str | Path, resource_type_filter: Iterable[str] | None = None
+    manifest_file: str | Path,
+    resource_type_filter: Iterable[str] | None = None,
+    cache_dir: str | Path | None = None,
 ) -> dict[str, dict[str, Any]]:
     """
-    Fetches the dbt resources from a generated manifest.json (e.g. dbt compile)
+    Fetches the dbt resources from a generated manifest.json (e.g. dbt compile).
+
+    Each returned resource also carries its storage name (e.g. prep.core.calendar)
+    under RESOURCE_NAME_KEY.
+
+    Parsed manifests are cached for the lifetime of the process, keyed on the file's
+    path, modification time and size, so repeated calls on an unchanged manifest are
+    free. Note that the returned resource dicts are shared between calls and should be
+    treated as read-only.
     :param manifest_file manifest file generated by dbt (e.g. manifest.json)
     :param resource_type_filter An optional resource type filter that will be applied
       before the resources are returned. For example ['snapshot', 'model']
+    :param cache_dir An optional directory (e.g. DEFAULT_CACHE_DIR) in which the parsed
+      manifest is also cached between processes. The cache is invalidated whenever
+      the manifest file changes.
     :return: A dictionary containing the snowflake table name (e.g. prep.core.calendar)
       and the associated dbt manifest dict (table metadata).
     """
-    if isinstance(manifest_file, str):
-        manifest_file = Path(manifest_file)
-    with manifest_file.open() as f:
-        manifest = json.load(f)
-        manifest_nodes = manifest["nodes"]
+    manifest_file = Path(manifest_file).resolve()
+    stat = manifest_file.stat()
+    manifest_nodes = _load_manifest_nodes(
+        manifest_file=manifest_file,
+        mtime_ns=stat.st_mtime_ns,
+        size=stat.st_size,
+        cache_dir=Path(cache_dir) if cache_dir else None,
+    )
 
     return {
         unique_id: data
@@ -92,6 +141,119 @@ def extract_dbt_resources(
     }
 
 
+def iter_dbt_resources(
+    manifest_file: str | Path,
+    resource_type_filter: Iterable[str] | None = None,
+    fields: Iterable[str] | None = None,
+) -> Iterator[tuple[str, dict[str, Any]]]:
+    """
+    Like extract_dbt_resources, but yields (unique_id, resource) pairs one at a time.
+    When ijson is installed (the `stream` extra), the manifest is streamed so that only
+    one resource needs to be held in memory at a time, regardless of the size of the
+    manifest. Otherwise, this falls back to extract_dbt_resources. As with any
+    generator, the resources can only be iterated over once.
+    :param manifest_file manifest file generated by dbt (e.g. manifest.json)
+    :param resource_type_filter An optional resource type filter, see
+      extract_dbt_resources
+    :param fields An optional subset of each resource's keys to keep (e.g.
+      ['description', 'columns']), which cuts the memory held by the caller. The
+      resource's name is always kept under RESOURCE_NAME_KEY.
+    """
+    keep = set(fields) | {RESOURCE_NAME_KEY} if fields is not None else None
+    if not ijson:
+        resources = extract_dbt_resources(
+            manifest_file=manifest_file, resource_type_filter=resource_type_filter
+        )
+        for unique_id, data in resources.items():
+            # never trim the (shared) cached resources in place
+            yield unique_id, _project(data, keep) if keep else data
+        return
+
+    with Path(manifest_file).open("rb") as f:
+        for unique_id, data in ijson.kvitems(f, "nodes", use_float=True):
+            if (
+                not resource_type_filter
+                or data["resource_type"] in resource_type_filter
+            ):
+                data[RESOURCE_NAME_KEY] = get_resource_name(data)
+                yield unique_id, _project(data, keep) if keep else data
+
+
+def _project(data: dict[str, Any], keep: set[str]) -> dict[str, Any]:
+    return {k: v for k, v in data.items() if k in keep}
+
+
+@functools.lru_cache(maxsize=8)
+def _load_manifest_nodes(
+    manifest_file: Path, mtime_ns: int, size: int, cache_dir: Path | None
+) -> dict[str, dict[str, Any]]:
+    # mtime_ns and size are part of the (lru) cache key so that a changed manifest is
+    # read again
+    cache_key = (_CACHE_VERSION, mtime_ns, size)
+    cache_file = None
+    if cache_dir:
+        path_hash = hashlib.sha1(str(manifest_file).encode()).hexdigest()
+        cache_file = cache_dir / f"{path_hash}.pickle"
+        try:
+            with cache_file.open("rb") as f:
+                cached_key, cached_nodes = pickle.load(f)
+        except (
+            OSError,
+            EOFError,
+            pickle.UnpicklingError,
+            ValueError,
+            TypeError,
+            AttributeError,
+        ):
+            # missing, stale or foreign cache file: read the manifest again
+            pass
+        else:
+            if cached_key == cache_key:
+                logger.info("using cached manifest %s", cache_file)
+                return cached_nodes
+
+    # orjson (optional) decodes large manifests several times faster than json
+    manifest_nodes = _json.loads(manifest_file.read_bytes())["nodes"]
+    for node in manifest_nodes.values():
+        node[RESOURCE_NAME_KEY] = get_resource_name(node)
+
+    if cache_file:
+        _write_cache_file(cache_file, (cache_key, manifest_nodes))
+
+    return manifest_nodes
+
+
+def _write_cache_file(cache_file: Path, content: Any):
+    # the cache is only an optimization, so failing to write it is not an error
+    tmp_file = cache_file.with_suffix(f".{os.getpid()}.tmp")
+    try:
+        cache_file.parent.mkdir(parents=True, exist_ok=True)
+        # write then rename so that a concurrent reader never sees a partial file
+        with tmp_file.open("wb") as f:
+            pickle.dump(content, f, pickle.HIGHEST_PROTOCOL)
+        tmp_file.replace(cache_file)
+    except OSError as e:
+        logger.warning("could not write the manifest cache %s: %s", cache_file, e)
+        tmp_file.unlink(missing_ok=True)
+
+
+def get_dbt_direct_dependencies(
+    dbt_resources_by_unique_id: dict[str, dict[str, Any]]
+) -> dict[str, set[str]]:
+    """
+    Returns a dictionary of each DBT resource (unique_id) along with the unique_ids of
+    its direct upstream dependencies (parents). Unlike get_dbt_dependencies, the
+    dependency tree is not walked.
+    :param dbt_resources_by_unique_id: dict of DBT resources, from extract_dbt_resources
+    """
+    dependencies = {}
+    for unique_id, dbt_resource in dbt_resources_by_unique_id.items():
+        # the data lineage contains dupes
+        data_lineage = jmespath.search("depends_on.nodes", dbt_resource) or []
+        dependencies[unique_id] = set(data_lineage)
+    return dependencies
+
+
 def get_dbt_dependencies(
     dbt_resources_by_unique_id: dict[str, dict[str, Any]]
 ) -> dict[str, ModelDependencies]:
@@ -116,11 +278,9 @@ def get_dbt_dependencies(
 
     :param dbt_resources_by_unique_id: dict of DBT resources, from extract_dbt_resources
     """
-    dependencies = {}
-    for unique_id, dbt_resource in dbt_resources_by_unique_id.items():
-        # the data lineage contains dupes
-        data_lineage = jmespath.search("depends_on.nodes", dbt_resource) or []
-        dependencies[unique_id] = set(data_lineage)
+    dependencies = get_dbt_direct_dependencies(
+        dbt_resources_by_unique_id=dbt_resources_by_unique_id
+    )
 
     dependency_tree = {}
     for unique_id in dbt_resources_by_unique_id.keys():
@@ -0,0 +1,31 @@
+import pytest
+
+from datahub_tools import client
+
+
+class RecordedPosts(list):
+    """
+    Stands in for datahub_post: records the posted bodies and answers with respond(body).
+    By default, mutations succeed and queries find nothing.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.respond = self.default_response
+
+    def __call__(self, body: dict) -> dict:
+        self.append(body)
+        return self.respond(body)
+
+    @staticmethod
+    def default_response(body: dict) -> dict:
+        if body["query"].startswith("mutation"):
+            return {"data": {k: True for k in body["variables"]}}
+        return {"data": {"search": {"searchResults": []}}}
+
+
+@pytest.fixture
+def recorded_posts(monkeypatch) -> RecordedPosts:
+    posts = RecordedPosts()
+    monkeypatch.setattr(client, "datahub_post", posts)
+    return posts
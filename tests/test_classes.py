@@ -1,4 +1,8 @@
-from datahub_tools.classes import DHTag
+import dataclasses
+import pickle
+
+from datahub_tools import client
+from datahub_tools.classes import DHEntity, DHTag
 
 
 def test_dhtag():
@@ -8,3 +12,136 @@ def test_dhtag():
     )
     assert priority_tag.is_priority()
     assert priority_tag.get_priority() == priority
+
+    # tags without properties have no name
+    assert DHTag(name=None, urn="urn:li:tag:Priority: P1").get_priority() == "P1"
+    # malformed priority tags have no priority
+    assert DHTag(name="Priority", urn="urn:li:tag:Priority").get_priority() is None
+
+
+def _entity_dict():
+    return {
+        "urn": "urn:li:dataset:(urn:li:dataPlatform:dbt,prep.core.calendar,PROD)",
+        "type": "DATASET",
+        "name": "calendar",
+        "properties": {
+            "qualifiedName": "prep.core.calendar",
+            "description": "a calendar",
+            "customProperties": [{"key": "priority", "value": "P0"}],
+        },
+        "editableProperties": None,
+        "ownership": {
+            "owners": [
+                {
+                    "ownershipType": {"info": {"name": "Technical Owner"}},
+                    "owner": {"urn": "urn:li:corpGroup:data"},
+                }
+            ]
+        },
+        "tags": {
+            "tags": [
+                {
+                    "tag": {
+                        "urn": "urn:li:tag:Priority: P0",
+                        "properties": {"name": "Priority: P0"},
+                    }
+                }
+            ]
+        },
+    }
+
+
+def test_dhentity_from_dict():
+    entity = DHEntity.from_dict(_entity_dict())
+
+    assert entity.name == "prep.core.calendar"
+    assert entity.description == "a calendar"
+    assert entity.editable_description is None
+    assert entity.fields == []
+    assert entity.metadata == {"priority": "P0"}
+    assert entity.owners == {"Technical Owner": ["urn:li:corpGroup:data"]}
+    assert entity.tags == [DHTag(name="Priority: P0", urn="urn:li:tag:Priority: P0")]
+    assert entity.get_priority() == "P0"
+
+
+def test_dhentity_from_dict_fallback_name():
+    _dict = _entity_dict()
+    _dict["properties"] = None
+    entity = DHEntity.from_dict(_dict)
+
+    assert entity.name == "calendar"
+    assert entity.metadata == {}
+
+
+def test_dhentity_priority():
+    _dict = _entity_dict()
+    _dict["tags"] = None
+    assert DHEntity.from_dict(_dict).get_priority() is None
+
+    # the first priority tag wins
+    _dict["tags"] = {
+        "tags": [
+            {
+                "tag": {
+                    "urn": f"urn:li:tag:Priority: {x}",
+                    "properties": {"name": f"Priority: {x}"},
+                }
+            }
+            for x in ("P1", "P2")
+        ]
+    }
+    assert DHEntity.from_dict(_dict).get_priority() == "P1"
+
+
+def test_dhentity_priority_tag_without_properties():
+    _dict = _entity_dict()
+    _dict["tags"] = {
+        "tags": [
+            {"tag": {"urn": "urn:li:tag:Priority", "properties": None}},
+            {"tag": {"urn": "urn:li:tag:Priority: P0", "properties": None}},
+        ]
+    }
+    assert DHEntity.from_dict(_dict).get_priority() == "P0"
+
+
+def test_dhentity_priority_follows_tags():
+    entity = DHEntity.from_dict(_entity_dict())
+    assert entity.get_priority() == "P0"
+
+    entity.tags = [DHTag(name="Priority: P2", urn="urn:li:tag:Priority: P2")]
+    assert entity.get_priority() == "P2"
+
+    entity.tags = [*entity.tags, DHTag(name="dbt:model", urn="urn:li:tag:dbt:model")]
+    assert entity.get_priority() == "P2"
+
+    entity.tags = None
+    assert entity.get_priority() is None
+    # a dataclass field, which is not compared (it follows the tags)
+    fields = {x.name: x for x in dataclasses.fields(entity)}
+    assert not fields["priority"].compare
+
+
+def test_dhentity_slots():
+    entity = DHEntity.from_dict(_entity_dict())
+
+    assert not hasattr(entity, "__dict__")
+    assert not hasattr(entity.tags[0], "__dict__")
+    assert pickle.loads(pickle.dumps(entity)) == entity
+
+
+def test_dhentity_delete_many(monkeypatch):
+    deleted = []
+
+    class _Graph:
+        def hard_delete_entity(self, urn):
+            deleted.append(urn)
+            return 1, 0
+
+    monkeypatch.setattr(client, "get_dh_graph", lambda: _Graph())
+    entity = DHEntity.from_dict(_entity_dict())
+    other = DHEntity.from_dict({**_entity_dict(), "urn": "urn:other"})
+
+    DHEntity.delete_many([entity, other])
+    entity.delete()
+
+    assert deleted == [entity.urn, "urn:other", entity.urn]
@@ -0,0 +1,574 @@
+import io
+import json
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from datahub_tools import client
+from datahub_tools.classes import DataHubError
+
+
+def test_update_tags_single_request(recorded_posts):
+    client.update_tags(
+        tags_to_add={"urn:li:tag:a": ["urn:1"]},
+        tags_to_remove={"urn:li:tag:b": ["urn:2"]},
+    )
+
+    assert len(recorded_posts) == 1
+    query = recorded_posts[0]["query"]
+    # removals are applied before adds
+    assert query.index("m0: batchRemoveTags") < query.index("m1: batchAddTags")
+    assert recorded_posts[0]["variables"]["m1"] == {
+        "tagUrns": ["urn:li:tag:a"],
+        "resources": [{"resourceUrn": "urn:1"}],
+    }
+
+
+def test_set_group_owner_variables(recorded_posts):
+    client.set_group_owner(group_urn="urn:li:corpGroup:data", resource_urns=["urn:1"])
+
+    (body,) = recorded_posts
+    assert body["query"] == (
+        "mutation batchMutations($m0: BatchAddOwnersInput!) "
+        "{ m0: batchAddOwners(input: $m0) }"
+    )
+    assert body["variables"]["m0"] == {
+        "owners": [
+            {
+                "ownerUrn": "urn:li:corpGroup:data",
+                "ownerEntityType": "CORP_GROUP",
+                "ownershipTypeUrn": client.TECHNICAL_OWNER,
+            }
+        ],
+        "resources": [{"resourceUrn": "urn:1"}],
+    }
+
+
+def test_get_owners_bulk(monkeypatch, recorded_posts):
+    def _respond(body):
+        # unknown datasets come back as null
+        data = {
+            k: (
+                {"ownership": {"owners": [{"owner": {"urn": f"owner:{v}"}}]}}
+                if v != "urn:missing"
+                else None
+            )
+            for k, v in body["variables"].items()
+        }
+        return {"data": data}
+
+    recorded_posts.respond = _respond
+    monkeypatch.setattr(client, "_MAX_QUERIES_PER_REQUEST", 2)
+
+    owners = client.get_owners_bulk(["urn:missing", "urn:1", "urn:2"])
+    assert owners == {
+        "urn:missing": [],
+        "urn:1": [{"urn": "owner:urn:1"}],
+        "urn:2": [{"urn": "owner:urn:2"}],
+    }
+    assert len(recorded_posts) == 2
+    assert recorded_posts[0]["query"].startswith(
+        "query getOwners($r0: String!, $r1: String!)"
+    )
+
+    assert client.get_owners("urn:1") == [{"urn": "owner:urn:1"}]
+
+
+def test_set_tags_batches(monkeypatch, recorded_posts):
+    monkeypatch.setattr(client, "_MAX_RESOURCES_PER_MUTATION", 2)
+    monkeypatch.setattr(client, "_MAX_MUTATIONS_PER_REQUEST", 2)
+    urns = [f"urn:{i}" for i in range(5)]
+    client.set_tags(tag_urns="urn:li:tag:a", resource_urns=urns, max_workers=2)
+
+    # 3 mutations (of at most 2 resources each), sent in 2 requests
+    assert len(recorded_posts) == 2
+    variables = {k: v for x in recorded_posts for k, v in x["variables"].items()}
+    assert sorted(variables) == ["m0", "m1", "m2"]
+    assert [
+        x["resourceUrn"] for k in sorted(variables) for x in variables[k]["resources"]
+    ] == urns
+
+
+def test_update_dataset_description_variables(recorded_posts):
+    def _respond(body):
+        return {"data": {"updateDataset": {"urn": "urn:1"}}}
+
+    recorded_posts.respond = _respond
+    description = 'a "quoted"\n\\description'
+    assert client.update_dataset_description("urn:1", description) == {"urn": "urn:1"}
+
+    (body,) = recorded_posts
+    assert body["query"] == (
+        "mutation updateDataset($urn: String!, $input: DatasetUpdateInput!) "
+        "{ updateDataset(urn: $urn, input: $input) { urn } }"
+    )
+    assert body["variables"] == {
+        "urn": "urn:1",
+        "input": {"editableProperties": {"description": description}},
+    }
+
+
+def test_update_field_descriptions_batched(recorded_posts):
+    field_descriptions = {f"col{i}": f'the "{i}" column' for i in range(120)}
+    responses = client.update_field_descriptions(
+        resource_urn="urn:a", field_descriptions=field_descriptions
+    )
+
+    assert responses == {k: True for k in field_descriptions}
+    # 50 mutations per request
+    assert len(recorded_posts) == 3
+    assert "m50: updateDescription" in recorded_posts[1]["query"]
+    # inputs are sent as variables, not in the query
+    assert "$m50: DescriptionUpdateInput!" in recorded_posts[1]["query"]
+    assert recorded_posts[0]["variables"]["m0"] == {
+        "description": 'the "0" column',
+        "resourceUrn": "urn:a",
+        "subResourceType": "DATASET_FIELD",
+        "subResource": "col0",
+    }
+
+    recorded_posts.clear()
+    responses = client.update_field_descriptions(
+        resource_urn="urn:a", field_descriptions=field_descriptions, max_workers=3
+    )
+    assert responses == {k: True for k in field_descriptions}
+    assert len(recorded_posts) == 3
+
+
+def test_update_field_descriptions_bulk(recorded_posts):
+    responses = client.update_field_descriptions_bulk(
+        {"urn:a": {"col0": "a0", "col1": "a1"}, "urn:b": {"col0": "b0"}}
+    )
+
+    assert responses == {
+        "urn:a": {"col0": True, "col1": True},
+        "urn:b": {"col0": True},
+    }
+    (body,) = recorded_posts
+    assert [
+        (x["resourceUrn"], x["subResource"]) for x in body["variables"].values()
+    ] == [
+        ("urn:a", "col0"),
+        ("urn:a", "col1"),
+        ("urn:b", "col0"),
+    ]
+
+
+def test_get_datahub_entities_name_filter(monkeypatch, recorded_posts):
+    raw_entities = [
+        # e.g. dbt doesn't set the qualifiedName, the name is then used
+        {"urn": "urn:1", "name": "a.b.c", "properties": {"qualifiedName": None}},
+        {"urn": "urn:2", "name": "x", "properties": {"qualifiedName": "b.c.d"}},
+        {"urn": "urn:3", "name": "x.y.z", "properties": None},
+    ]
+
+    def _respond(body):
+        results = [] if body["variables"]["start"] else raw_entities
+        return {"data": {"search": {"searchResults": [{"entity": x} for x in results]}}}
+
+    recorded_posts.respond = _respond
+    # the buffered (non-streaming) paging
+    monkeypatch.setattr(client, "ijson", None)
+    entities = client.get_datahub_entities(name_filter={"b.c.d", "a.b.c"})
+    assert [x.urn for x in entities] == ["urn:1", "urn:2"]
+    # the names are not filtered on by DataHub
+    assert recorded_posts[0]["variables"]["orFilters"] is None
+
+    entities = client.iter_datahub_entities(name_filter=["a.b.c"])
+    assert [x.urn for x in entities] == ["urn:1"]
+
+    recorded_posts.clear()
+    assert client.get_datahub_entities(name_filter=[]) == []
+    assert not recorded_posts
+
+
+def test_get_datahub_entities_platform(monkeypatch, recorded_posts):
+    # the buffered (non-streaming) paging
+    monkeypatch.setattr(client, "ijson", None)
+    client.get_datahub_entities(name_filter=["a.b.c"], platform="dbt")
+
+    (body,) = recorded_posts
+    assert body["variables"]["orFilters"] == [
+        {"and": [{"field": "platform", "values": ["urn:li:dataPlatform:dbt"]}]}
+    ]
+    assert "orFilters: $orFilters" in body["query"]
+
+
+def test_get_datahub_entities_resource_urns_chunks(recorded_posts):
+    def _respond(body):
+        urns = body["variables"].values()
+        results = {f"dataset{i}": {"urn": x, "name": x} for i, x in enumerate(urns)}
+        return {"data": results}
+
+    recorded_posts.respond = _respond
+    urns = [f"urn:{i}" for i in range(5)]
+
+    entities = client.get_datahub_entities(resource_urns=urns)
+    assert [x.urn for x in entities] == urns
+    assert len(recorded_posts) == 1
+
+    recorded_posts.clear()
+    entities = client.get_datahub_entities(
+        resource_urns=urns, chunk_size=2, max_workers=3
+    )
+    assert [x.urn for x in entities] == urns
+    assert len(recorded_posts) == 3
+
+
+def test_get_datahub_entities_parse_workers(recorded_posts):
+    pages = [
+        [{"entity": {"urn": f"urn:{i}", "name": f"name{i}"}} for i in range(3)],
+        [],
+    ]
+
+    def _respond(body):
+        return {"data": {"search": {"searchResults": pages.pop(0)}}}
+
+    recorded_posts.respond = _respond
+    entities = client.get_datahub_entities(parse_workers=2)
+
+    assert [x.urn for x in entities] == ["urn:0", "urn:1", "urn:2"]
+    assert [x.name for x in entities] == ["name0", "name1", "name2"]
+
+
+def test_get_datahub_entities_schema_fields(monkeypatch, recorded_posts):
+    def _respond(body):
+        entity = {
+            "urn": "urn:0",
+            "name": "a",
+            "schemaMetadata": {"fields": [{"fieldPath": "col", "description": "d"}]},
+        }
+        return {"data": {"search": {"searchResults": [{"entity": entity}]}}}
+
+    recorded_posts.respond = _respond
+    monkeypatch.setattr(client, "ijson", None)
+
+    (entity,) = client.get_datahub_entities(limit=1, with_schema={"description"})
+    assert entity.fields[0].description == "d"
+    assert entity.fields[0].tags is None
+    (body,) = recorded_posts
+    assert "...on SchemaField { fieldPath description }" in body["query"]
+    assert "glossaryTerms" not in body["query"]
+
+    client.get_datahub_entities(limit=1, with_schema=True)
+    assert "glossaryTerms" in recorded_posts[1]["query"]
+
+    with pytest.raises(ValueError):
+        client.get_datahub_entities(with_schema={"unknown"})
+
+
+def test_get_datahub_entities_paging(monkeypatch, recorded_posts):
+    def _respond(body):
+        start, count = body["variables"]["start"], body["variables"]["count"]
+        results = [
+            {"entity": {"urn": f"urn:{i}", "name": str(i)}}
+            for i in range(start, min(start + count, 7))
+        ]
+        return {"data": {"search": {"searchResults": results}}}
+
+    recorded_posts.respond = _respond
+    # the buffered (non-streaming) paging
+    monkeypatch.setattr(client, "ijson", None)
+
+    entities = client.get_datahub_entities(start=1, limit=5, chunk_size=2)
+    assert [x.urn for x in entities] == [f"urn:{i}" for i in range(1, 6)]
+    # the last page only asks for what is still missing
+    assert [x["variables"]["count"] for x in recorded_posts] == [2, 2, 1]
+    # the query itself is the same for every page
+    assert len({x["query"] for x in recorded_posts}) == 1
+
+    recorded_posts.clear()
+    entities = client.get_datahub_entities(chunk_size=3)
+    assert len(entities) == 7
+    assert len(recorded_posts) == 4
+
+
+def test_get_datahub_entities_scroll(recorded_posts):
+    def _respond(body):
+        start = int(body["variables"]["scrollId"] or 0)
+        stop = min(start + body["variables"]["count"], 5)
+        results = [
+            {"entity": {"urn": f"urn:{i}", "name": str(i)}} for i in range(start, stop)
+        ]
+        next_scroll_id = str(stop) if stop < 5 else None
+        page = {"nextScrollId": next_scroll_id, "searchResults": results}
+        return {"data": {"scrollAcrossEntities": page}}
+
+    recorded_posts.respond = _respond
+
+    entities = client.get_datahub_entities(chunk_size=2, scroll=True)
+    assert [x.urn for x in entities] == [f"urn:{i}" for i in range(5)]
+    assert [x["variables"]["scrollId"] for x in recorded_posts] == [None, "2", "4"]
+    assert all("scrollAcrossEntities" in x["query"] for x in recorded_posts)
+
+    entities = client.iter_datahub_entities(limit=3, chunk_size=2, scroll=True)
+    assert [x.urn for x in entities] == [f"urn:{i}" for i in range(3)]
+
+    with pytest.raises(ValueError):
+        client.get_datahub_entities(start=1, scroll=True)
+
+
+def test_get_datahub_entities_concurrent_paging(recorded_posts):
+    def _respond(body):
+        start, count = body["variables"]["start"], body["variables"]["count"]
+        results = [
+            {"entity": {"urn": f"urn:{i}", "name": str(i)}}
+            for i in range(start, min(start + count, 10))
+        ]
+        return {"data": {"search": {"total": 10, "searchResults": results}}}
+
+    recorded_posts.respond = _respond
+
+    entities = client.get_datahub_entities(chunk_size=3, max_workers=3)
+    assert [x.urn for x in entities] == [f"urn:{i}" for i in range(10)]
+    # no request past the total
+    assert len(recorded_posts) == 4
+
+    recorded_posts.clear()
+    entities = client.get_datahub_entities(limit=5, chunk_size=3, max_workers=3)
+    assert [x.urn for x in entities] == [f"urn:{i}" for i in range(5)]
+    assert len(recorded_posts) == 2
+
+
+class _StreamedResponse:
+    def __init__(self, content: bytes):
+        self.raw = io.BytesIO(content)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        pass
+
+    def raise_for_status(self):
+        pass
+
+
+def _stream_session(responses: list[dict]):
+    class _Session:
+        def post(self, url, data, stream=False):
+            assert stream
+            return _StreamedResponse(json.dumps(responses.pop(0)).encode())
+
+    return _Session()
+
+
+def test_iter_datahub_entities(monkeypatch):
+    pages = [
+        {
+            "data": {
+                "search": {"searchResults": [{"entity": {"urn": "urn:0", "name": "a"}}]}
+            }
+        },
+        {"data": {"search": {"searchResults": []}}},
+    ]
+    monkeypatch.setattr(client, "get_dh_graphql_url", lambda: "url")
+    monkeypatch.setattr(client, "get_dh_session", lambda: _stream_session(pages))
+
+    entities = client.iter_datahub_entities(chunk_size=1)
+    assert next(entities).urn == "urn:0"
+    assert list(entities) == []
+    assert not pages
+
+
+def test_get_datahub_entities_streamed(monkeypatch):
+    pages = [
+        {
+            "data": {
+                "search": {"searchResults": [{"entity": {"urn": "urn:0", "name": "a"}}]}
+            }
+        },
+        {"data": {"search": {"searchResults": []}}},
+    ]
+    monkeypatch.setattr(client, "get_dh_graphql_url", lambda: "url")
+    monkeypatch.setattr(client, "get_dh_session", lambda: _stream_session(pages))
+
+    entities = client.get_datahub_entities(chunk_size=1)
+    assert [x.urn for x in entities] == ["urn:0"]
+    assert not pages
+
+
+def test_iter_datahub_entities_errors(monkeypatch):
+    pages = [{"errors": [{"message": "boom"}], "data": None}]
+    monkeypatch.setattr(client, "get_dh_graphql_url", lambda: "url")
+    monkeypatch.setattr(client, "get_dh_session", lambda: _stream_session(pages))
+
+    with pytest.raises(DataHubError):
+        list(client.iter_datahub_entities())
+
+
+def test_get_datahub_users_paging(recorded_posts):
+    users = [{"urn": f"urn:li:corpuser:{i}"} for i in range(5)]
+
+    def _respond(body):
+        start, count = body["variables"]["start"], body["variables"]["count"]
+        return {
+            "data": {
+                "listUsers": {
+                    "total": len(users),
+                    "users": users[start : start + count],
+                }
+            }
+        }
+
+    recorded_posts.respond = _respond
+
+    assert client.get_datahub_users(fields="urn", page_size=2) == users
+    assert len(recorded_posts) == 3
+    assert "users { urn }" in recorded_posts[0]["query"]
+
+    recorded_posts.clear()
+    assert client.get_datahub_users(fields="urn", page_size=2, max_workers=2) == users
+    assert len(recorded_posts) == 3
+
+
+def test_get_datahub_entities_cache(monkeypatch, recorded_posts):
+    # the buffered (non-streaming) paging
+    monkeypatch.setattr(client, "ijson", None)
+    monkeypatch.setattr(client, "get_dh_graphql_url", lambda: "url")
+    client.get_datahub_entities.cache_clear()
+    try:
+        client.get_datahub_entities(cache_ttl=60)
+        client.get_datahub_entities(cache_ttl=60)
+        assert len(recorded_posts) == 1
+
+        # different arguments, or no cache_ttl, always query DataHub
+        client.get_datahub_entities(cache_ttl=60, limit=5)
+        client.get_datahub_entities()
+        assert len(recorded_posts) == 3
+
+        # expired
+        client.get_datahub_entities(cache_ttl=0, limit=7)
+        client.get_datahub_entities(cache_ttl=0, limit=7)
+        assert len(recorded_posts) == 5
+    finally:
+        client.get_datahub_entities.cache_clear()
+
+
+def test_response_cache(monkeypatch, recorded_posts):
+    def _respond(body):
+        if "listUsers" in body["query"]:
+            return {"data": {"listUsers": {"total": 1, "users": [{"urn": "u"}]}}}
+        return recorded_posts.default_response(body)
+
+    recorded_posts.respond = _respond
+    monkeypatch.setattr(client, "get_dh_graphql_url", lambda: "url")
+    client.clear_response_cache()
+    try:
+        assert client.get_glossary_terms(cache_ttl=60) == []
+        assert client.get_glossary_terms(cache_ttl=60) == []
+        assert len(recorded_posts) == 1
+
+        # mutations clear the cache
+        client.set_tags(tag_urns="urn:li:tag:a", resource_urns="urn:1")
+        client.get_glossary_terms(cache_ttl=60)
+        assert len(recorded_posts) == 3
+
+        # users/groups are cached page by page
+        client.get_datahub_users(fields="urn", cache_ttl=60)
+        client.get_datahub_users(fields="urn", cache_ttl=60)
+        assert len(recorded_posts) == 4
+    finally:
+        client.clear_response_cache()
+
+
+def test_get_cached_threads():
+    cache = {}
+
+    def _get(i):
+        return client._get_cached(
+            cache=cache, key=i % 16, ttl=60, fetch=lambda: i, maxsize=4
+        )
+
+    # the threads of max_workers share the caches
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        list(executor.map(_get, range(5000)))
+    assert len(cache) <= 4
+
+
+def test_emit_metadata_patch(monkeypatch):
+    emitted = []
+
+    class _Emitter:
+        def emit(self, item):
+            emitted.append(item)
+
+    monkeypatch.setattr(client, "get_dh_emitter", lambda: _Emitter())
+    client.emit_metadata_patch(
+        resource_urn="urn:li:dataset:(urn:li:dataPlatform:dbt,a.b.c,PROD)",
+        add={"priority": "P0"},
+        remove=["old"],
+    )
+
+    assert len(emitted) == 1
+    assert emitted[0].changeType == "PATCH"
+    assert emitted[0].aspectName == "datasetProperties"
+    patch = emitted[0].aspect.value.decode()
+    assert '"path": "/customProperties/priority", "value": "P0"' in patch
+    assert '"op": "remove", "path": "/customProperties/old"' in patch
+
+
+def test_emit_metadata_patches(monkeypatch):
+    calls = []
+
+    class _Emitter:
+        def emit_mcps(self, items):
+            calls.append(items)
+
+    monkeypatch.setattr(client, "get_dh_emitter", lambda: _Emitter())
+    urns = [f"urn:li:dataset:(urn:li:dataPlatform:dbt,a.b.{x},PROD)" for x in "cd"]
+    client.emit_metadata_patches(
+        items=[(urns[0], {"priority": "P0"}, None), (urns[1], None, ["priority"])]
+    )
+
+    # a single request for all the patches
+    (events,) = calls
+    assert [x.entityUrn for x in events] == urns
+    assert all(x.changeType == "PATCH" for x in events)
+
+
+def test_emit_metadata_batch(monkeypatch):
+    calls = []
+
+    class _Emitter:
+        def emit(self, item):
+            calls.append([item])
+
+        def emit_mcps(self, items):
+            calls.append(items)
+
+    monkeypatch.setattr(client, "get_dh_emitter", lambda: _Emitter())
+    urns = [f"urn:li:dataset:(urn:li:dataPlatform:dbt,a.b.{x},PROD)" for x in "cd"]
+    client.emit_metadata_batch(
+        items=[(urns[0], {"b": "2", "a": "1"}), (urns[1], {"c": 3})], cast_to_str=True
+    )
+
+    # a single request for the whole batch
+    (events,) = calls
+    assert [x.entityUrn for x in events] == urns
+    assert events[0].aspect.customProperties == {"a": "1", "b": "2"}
+    assert list(events[0].aspect.customProperties) == ["a", "b"]
+    assert events[1].aspect.customProperties == {"c": "3"}
+
+    # without cast_to_str, the offending entry is reported
+    with pytest.raises(ValueError, match="'c': 3"):
+        client.emit_metadata_batch(items=[(urns[1], {"c": 3})])
+
+
+def test_get_dh_session(monkeypatch):
+    monkeypatch.setenv("DATAHUB_GMS_TOKEN", "secret")
+    client.get_dh_token.cache_clear()
+    client.get_dh_session.cache_clear()
+    try:
+        session = client.get_dh_session()
+        assert session is client.get_dh_session()
+        assert session.headers["Authorization"] == "Bearer secret"
+        retry = session.get_adapter("https://datahub").max_retries
+        assert retry.total == 3 and retry.is_retry("POST", 503)
+
+        # the token is only read once
+        monkeypatch.setenv("DATAHUB_GMS_TOKEN", "other")
+        assert client.get_dh_token() == "secret"
+    finally:
+        client.get_dh_token.cache_clear()
+        client.get_dh_session.cache_clear()
@@ -0,0 +1,127 @@
+import json
+import os
+import pickle
+
+from datahub_tools.dbt import (
+    RESOURCE_NAME_KEY,
+    extract_dbt_resources,
+    get_dbt_direct_dependencies,
+    get_resource_name,
+    iter_dbt_resources,
+)
+
+
+def _write_manifest(path, nodes):
+    path.write_text(json.dumps({"nodes": nodes}))
+
+
+def _node(unique_id, resource_type="model", depends_on=()):
+    return {
+        "unique_id": unique_id,
+        "resource_type": resource_type,
+        "database": "db",
+        "schema": "sch",
+        "alias": None,
+        "name": unique_id.rsplit(".", 1)[-1],
+        "depends_on": {"nodes": list(depends_on)},
+    }
+
+
+def test_extract_dbt_resources(tmp_path):
+    manifest_file = tmp_path / "manifest.json"
+    _write_manifest(
+        manifest_file,
+        {"model.a": _node("model.a"), "test.b": _node("test.b", resource_type="test")},
+    )
+
+    assert set(extract_dbt_resources(manifest_file)) == {"model.a", "test.b"}
+    assert set(extract_dbt_resources(str(manifest_file), ["model"])) == {"model.a"}
+
+
+def test_resource_name(tmp_path):
+    manifest_file = tmp_path / "manifest.json"
+    _write_manifest(manifest_file, {"model.a": _node("model.a")})
+    resource = extract_dbt_resources(manifest_file)["model.a"]
+
+    assert resource[RESOURCE_NAME_KEY] == "db.sch.a"
+    assert get_resource_name({**_node("model.a"), "alias": "b"}) == "db.sch.b"
+
+
+def test_extract_dbt_resources_cache(tmp_path):
+    manifest_file = tmp_path / "manifest.json"
+    cache_dir = tmp_path / "cache"
+    _write_manifest(manifest_file, {"model.a": _node("model.a")})
+
+    assert set(extract_dbt_resources(manifest_file, cache_dir=cache_dir)) == {"model.a"}
+    assert len(list(cache_dir.iterdir())) == 1
+
+    # a changed manifest invalidates both the in-process and the on-disk cache
+    _write_manifest(manifest_file, {"model.bb": _node("model.bb")})
+    stat = manifest_file.stat()
+    os.utime(manifest_file, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000))
+    assert set(extract_dbt_resources(manifest_file, cache_dir=cache_dir)) == {
+        "model.bb"
+    }
+
+
+def test_extract_dbt_resources_cache_errors(tmp_path, monkeypatch):
+    manifest_file = tmp_path / "manifest.json"
+    cache_dir = tmp_path / "cache"
+    _write_manifest(manifest_file, {"model.a": _node("model.a")})
+    extract_dbt_resources(manifest_file, cache_dir=cache_dir)
+    (cache_file,) = cache_dir.iterdir()
+
+    # a foreign pickle is a cache miss
+    cache_file.write_bytes(pickle.dumps(None))
+    os.utime(manifest_file, ns=(0, 1))
+    assert set(extract_dbt_resources(manifest_file, cache_dir=cache_dir)) == {"model.a"}
+
+    # failing to write the cache doesn't fail the extraction
+    def _fail(*args):
+        raise OSError("disk full")
+
+    monkeypatch.setattr(pickle, "dump", _fail)
+    os.utime(manifest_file, ns=(0, 2))
+    assert set(extract_dbt_resources(manifest_file, cache_dir=cache_dir)) == {"model.a"}
+    assert list(cache_dir.iterdir()) == [cache_file]
+
+
+def test_get_dbt_direct_dependencies():
+    resources = {
+        "model.a": _node("model.a"),
+        "model.b": _node("model.b", depends_on=["model.a", "model.a"]),
+        "model.c": _node("model.c", depends_on=["model.b", "source.s"]),
+    }
+    assert get_dbt_direct_dependencies(resources) == {
+        "model.a": set(),
+        "model.b": {"model.a"},
+        "model.c": {"model.b", "source.s"},
+    }
+
+
+def test_iter_dbt_resources(tmp_path):
+    manifest_file = tmp_path / "manifest.json"
+    _write_manifest(
+        manifest_file,
+        {"model.a": _node("model.a"), "test.b": _node("test.b", resource_type="test")},
+    )
+
+    resources = dict(iter_dbt_resources(manifest_file, ["model"]))
+    assert resources == extract_dbt_resources(manifest_file, ["model"])
+    assert resources["model.a"][RESOURCE_NAME_KEY] == "db.sch.a"
+
+
+def test_iter_dbt_resources_fields(tmp_path, monkeypatch):
+    manifest_file = tmp_path / "manifest.json"
+    _write_manifest(manifest_file, {"model.a": _node("model.a")})
+
+    for stream in (True, False):
+        if not stream:
+            monkeypatch.setattr("datahub_tools.dbt.ijson", None)
+        resources = dict(iter_dbt_resources(manifest_file, fields=["resource_type"]))
+        assert resources == {
+            "model.a": {"resource_type": "model", RESOURCE_NAME_KEY: "db.sch.a"}
+        }
+
+    # the cached resources are left untouched
+    assert "depends_on" in extract_dbt_resources(manifest_file)["model.a"]